@@ -3,13 +3,24 @@ from flask_socketio import SocketIO
 import base64
 import io
 from PIL import Image, ImageDraw
-from ultralytics import YOLO
+
+from lazy_models import LazyModels, init_app
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Charger le modèle YOLOv8
-model = YOLO("yolov8n.pt")  # tu peux utiliser yolov8s.pt ou m/l selon la précision souhaitée
+def load_yolo():
+    # Import d'ultralytics (et de torch) seulement au chargement du modèle
+    from ultralytics import YOLO
+
+    # Charger le modèle YOLOv8
+    return YOLO("yolov8n.pt")  # tu peux utiliser yolov8s.pt ou m/l selon la précision souhaitée
+
+# Chargé en arrière-plan au démarrage (voir lazy_models.py)
+LAZY_MODELS = LazyModels()
+LAZY_MODELS.register("yolov8n", load_yolo)
+# socketio.run sans debug : pas de reloader, le chauffage démarre tout de suite
+init_app(app, LAZY_MODELS)
 
 @socketio.on('frame')
 def handle_frame(data):
@@ -19,6 +30,7 @@ def handle_frame(data):
         image = Image.open(io.BytesIO(img_data)).convert('RGB')
 
         # Prédiction avec YOLOv8
+        model = LAZY_MODELS.get("yolov8n")
         results = model(image)
 
         # Dessiner les boîtes avec PIL
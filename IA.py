@@ -1,29 +1,358 @@
-from flask import Flask, request, jsonify
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+import json
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from answer_cache import SemanticIndex, calibrate_threshold, cosine, load_pairs, weights_version
+from batching import MicroBatcher
+from cpus import available_cpus
+from lazy_models import LazyModels, debug_mode, init_app, serving_process
+from ttl_cache import SQLiteCache, TTLCache, normalize_key
 
 # Initialiser Flask
 app = Flask(__name__)
+DEBUG = debug_mode()
 
-# Charger le modèle et le tokenizer
+# ASK_BACKEND : eager (fp32), int8, compile ou int8,compile (voir gpt_backend.py)
 model_path = "models/gabon_gpt"
-model = GPT2LMHeadModel.from_pretrained(model_path)
-tokenizer = GPT2Tokenizer.from_pretrained(model_path)
+
+# Longueur maximale (question comprise) d'une réponse
+MAX_LENGTH = int(os.environ.get("ASK_MAX_LENGTH", 150))
+
+# Préfixe ajouté devant chaque question, encodé une seule fois au
+# chargement ; aucun par défaut (questions envoyées telles quelles)
+PROMPT_PREFIX = os.environ.get("ASK_PROMPT_PREFIX", "")
+
+GPT = namedtuple("GPT", ["model", "tokenizer", "prefix_ids"])
+
+def load_gpt():
+    """Modèle et tokenizer ; torch et transformers ne sont importés qu'ici."""
+    import torch
+    from transformers import GPT2Tokenizer
+    from gpt_backend import load_model
+
+    # Threads CPU : intra-op = cœurs attribués au processus (masque d'affinité,
+    # pas les cœurs de l'hôte ; réglable), inter-op = 1, les requêtes
+    # concurrentes étant déjà regroupées en un seul appel au modèle
+    torch.set_num_threads(int(os.environ.get("TORCH_NUM_THREADS", available_cpus())))
+    try:
+        torch.set_num_interop_threads(int(os.environ.get("TORCH_NUM_INTEROP_THREADS", 1)))
+    except RuntimeError:
+        pass  # déjà fixé par un autre module
+
+    model = load_model(model_path, os.environ.get("ASK_BACKEND", "eager"))
+    tokenizer = GPT2Tokenizer.from_pretrained(model_path)
+    # Lots de longueurs différentes : padding à gauche pour un modèle décodeur
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    prefix_ids = tokenizer.encode(PROMPT_PREFIX) if PROMPT_PREFIX else []
+    # Réponses en cache valables pour ces poids seulement
+    version = weights_version(model_path)
+    answer_cache.set_version(version)
+    semantic_index.set_version(version)
+    return GPT(model, tokenizer, prefix_ids)
+
+# Chargé en arrière-plan au démarrage (voir lazy_models.py)
+LAZY_MODELS = LazyModels()
+LAZY_MODELS.register("gpt", load_gpt)
+
+def encode_question(question):
+    gpt = LAZY_MODELS.get("gpt")
+    return gpt.prefix_ids + gpt.tokenizer.encode(question)
+
+def generate_batch(questions):
+    """
+    Génère les réponses d'un lot de questions en un seul appel à generate
+    et renvoie, pour chacune, le texte produit après la question. Chaque
+    réponse respecte MAX_LENGTH pour sa propre question, comme une
+    génération individuelle.
+    """
+    import torch
+
+    model, tokenizer, _ = LAZY_MODELS.get("gpt")
+    encoded = [encode_question(q) for q in questions]
+    lengths = [len(ids) for ids in encoded]
+    width = max(lengths)
+    input_ids = torch.full((len(encoded), width), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(encoded), width), dtype=torch.long)
+    for row, ids in enumerate(encoded):
+        input_ids[row, width - len(ids):] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, width - len(ids):] = 1
+
+    with torch.inference_mode():
+        outputs = model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            max_new_tokens=max(MAX_LENGTH - min(lengths), 1),
+            num_return_sequences=1,
+            pad_token_id=tokenizer.pad_token_id,
+        )
+
+    responses = []
+    for row, length in enumerate(lengths):
+        tokens = outputs[row, width:width - length + max(MAX_LENGTH, length)]
+        responses.append(tokenizer.decode(tokens, skip_special_tokens=True))
+    return responses
+
+class StreamSlot:
+    """Place prise dans STREAM_SLOTS, rendue une seule fois."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+        self._held = True
+        self.handed_off = False  # rendue par le thread de génération
+
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self._semaphore.release()
+
+def iter_tokens(question, slot=None):
+    """
+    Génère la réponse avec model.generate, comme generate_batch (mêmes
+    réglages de generation_config : température, top-k, top-p, pénalité de
+    répétition...), dans un thread, et produit le texte au fur et à mesure
+    via TextIteratorStreamer. Fermer le générateur (client déconnecté)
+    arrête la génération au token suivant. slot (StreamSlot) est rendu
+    quand le thread de génération se termine.
+    """
+    try:
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        model, tokenizer, _ = LAZY_MODELS.get("gpt")
+        prompt = encode_question(question)
+    except BaseException:
+        if slot is not None:
+            slot.release()
+        raise
+    if len(prompt) >= MAX_LENGTH:
+        if slot is not None:
+            slot.release()
+        return
+
+    stopped = threading.Event()
+    errors = []
+
+    class ClientGone(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return stopped.is_set()
+
+    # Le streamer retient les morceaux incomplets (caractère multi-octets,
+    # mot coupé) jusqu'à ce qu'ils soient décodables
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    input_ids = torch.tensor([prompt], dtype=torch.long)
+
+    def run():
+        try:
+            with torch.inference_mode():
+                model.generate(
+                    input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    max_new_tokens=MAX_LENGTH - len(prompt),
+                    pad_token_id=tokenizer.pad_token_id,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([ClientGone()]),
+                )
+        except Exception as e:
+            errors.append(e)
+            streamer.end()  # débloque la lecture ci-dessous
+        finally:
+            if slot is not None:
+                slot.release()
+
+    if slot is not None:
+        slot.handed_off = True
+    threading.Thread(target=run, name="ask-stream", daemon=True).start()
+    try:
+        for text in streamer:
+            if text:
+                yield text
+    finally:
+        stopped.set()
+    if errors:
+        raise errors[0]
+
+def stream_answer(question, fmt):
+    """
+    Réponse en flux : SSE (text/event-stream) ou NDJSON. Une génération
+    prend une place de STREAM_SLOTS ; 503 si aucune ne se libère à temps.
+    """
+    def event(payload, name=None):
+        data = json.dumps(payload, ensure_ascii=False)
+        if fmt == "ndjson":
+            return data + "\n"
+        return (f"event: {name}\n" if name else "") + f"data: {data}\n\n"
+
+    answer, vector = cached_answer(question)
+    cached = answer is not None
+    slot = None
+    if not cached:
+        if not STREAM_SLOTS.acquire(timeout=STREAM_WAIT):
+            return jsonify({"error": "Trop de réponses en cours, réessayez plus tard"}), 503, \
+                {"Retry-After": "1"}
+        slot = StreamSlot(STREAM_SLOTS)
+
+    def generate():
+        nonlocal answer
+        if cached:
+            yield event({"token": answer})
+        else:
+            pieces = []
+            for piece in iter_tokens(question, slot):
+                pieces.append(piece)
+                yield event({"token": piece})
+            # Mémorisée seulement si le client a tout reçu
+            answer = "".join(pieces)
+            remember_answer(question, answer, vector)
+        yield event({"done": True, "response": prompt_text(question) + answer, "cached": cached},
+                    name="done")
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+    response = Response(stream_with_context(generate()), mimetype=mimetype,
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    if slot is not None:
+        # Réponse jamais parcourue (client parti avant le premier morceau)
+        response.call_on_close(lambda: slot.handed_off or slot.release())
+    return response
+
+def stream_format(data):
+    """Format de flux demandé ("sse", "ndjson") ou None pour une réponse unique."""
+    stream = data.get("stream")
+    if stream in ("sse", "ndjson"):
+        return stream
+    if stream is True:
+        return "sse"
+    best = request.accept_mimetypes.best_match(["application/json", "text/event-stream",
+                                                "application/x-ndjson"])
+    return {"text/event-stream": "sse", "application/x-ndjson": "ndjson"}.get(best)
+
+# Cache des réponses, versionné par les poids du modèle (fixé à chaque
+# chargement du modèle) : exact (question normalisée) puis, en option,
+# sémantique (plongement de la question)
+ASK_CACHE_MAX = int(os.environ.get("ASK_CACHE_MAX", 1024))
+ASK_CACHE_TTL = float(os.environ.get("ASK_CACHE_TTL", 86400))
+if os.environ.get("ASK_CACHE_BACKEND", "memory") == "sqlite":
+    # Partagé par tous les workers de la machine
+    os.makedirs("model_cache", exist_ok=True)
+    answer_cache = SQLiteCache(os.path.join("model_cache", "ask_cache.sqlite3"),
+                               max_entries=ASK_CACHE_MAX, ttl=ASK_CACHE_TTL)
+else:
+    answer_cache = TTLCache(max_entries=ASK_CACHE_MAX, ttl=ASK_CACHE_TTL)
+# Le cache sémantique rend la réponse d'une autre question : désactivé par
+# défaut, et son seuil est calibré sur ASK_SEMANTIC_PAIRS au chargement
+# (ASK_SEMANTIC_THRESHOLD l'impose)
+SEMANTIC_CACHE = os.environ.get("ASK_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_PAIRS = os.environ.get("ASK_SEMANTIC_PAIRS", "ask_semantic_pairs.json")
+semantic_index = SemanticIndex(max_entries=ASK_CACHE_MAX, ttl=ASK_CACHE_TTL)
+
+def embed_question(question):
+    """Plongement d'une question : moyenne des derniers états cachés du GPT-2."""
+    import torch
+
+    input_ids = torch.tensor([encode_question(question)], dtype=torch.long)
+    with torch.inference_mode():
+        hidden = LAZY_MODELS.get("gpt").model.transformer(input_ids=input_ids).last_hidden_state
+    return hidden[0].mean(dim=0).float().numpy()
+
+def calibrate_semantic_index():
+    """
+    Centre (moyenne des plongements des questions de référence) et seuil
+    du cache sémantique, mesurés sur les paires de SEMANTIC_PAIRS avec les
+    poids chargés.
+    """
+    paraphrases, different = load_pairs(SEMANTIC_PAIRS)
+    questions = sorted({q for pair in paraphrases + different for q in pair})
+    vectors = {q: embed_question(q) for q in questions}
+    center = np.mean(list(vectors.values()), axis=0)
+
+    def scores(pairs):
+        return [cosine(vectors[a] - center, vectors[b] - center) for a, b in pairs]
+
+    threshold, recall = calibrate_threshold(scores(paraphrases), scores(different))
+    if "ASK_SEMANTIC_THRESHOLD" in os.environ:
+        threshold = float(os.environ["ASK_SEMANTIC_THRESHOLD"])
+    semantic_index.calibrate(center, threshold)
+    app.logger.info("Cache sémantique : seuil %.3f, %.0f %% des paraphrases de référence reconnues",
+                    threshold, 100 * recall)
+    return {"threshold": threshold, "paraphrase_recall": recall}
+
+if SEMANTIC_CACHE:
+    LAZY_MODELS.register("semantic", calibrate_semantic_index)
+
+def cached_answer(question):
+    """
+    (texte de réponse, plongement) ; le texte est None si la question n'est
+    pas en cache. Le plongement, calculé pour la recherche sémantique, sert
+    ensuite à mémoriser la réponse.
+    """
+    # Le modèle fixe la version du cache : attendre qu'il soit chargé
+    LAZY_MODELS.get("gpt")
+    answer = answer_cache.get(normalize_key(question))
+    if answer is not None or not SEMANTIC_CACHE:
+        return answer, None
+    LAZY_MODELS.get("semantic")
+    vector = embed_question(question)
+    return semantic_index.search(vector), vector
+
+def remember_answer(question, answer, vector=None):
+    answer_cache.set(normalize_key(question), answer)
+    if SEMANTIC_CACHE:
+        semantic_index.add(vector if vector is not None else embed_question(question), answer)
+
+def prompt_text(question):
+    """La question telle que le modèle la reproduit en tête de réponse."""
+    tokenizer = LAZY_MODELS.get("gpt").tokenizer
+    return tokenizer.decode(tokenizer.encode(question), skip_special_tokens=True)
+
+# Les questions concurrentes sont regroupées en lots
+ASK_BATCHER = MicroBatcher(
+    generate_batch,
+    max_batch_size=int(os.environ.get("ASK_BATCH_MAX", 8)),
+    max_wait_ms=float(os.environ.get("ASK_BATCH_WAIT_MS", 10)),
+    name="ask-batcher",
+)
+
+# Générations en flux simultanées : chacune est un model.generate à part,
+# hors des lots ; par défaut une seule, comme le thread du batcher, pour ne
+# pas dépasser les threads torch fixés dans load_gpt
+STREAM_SLOTS = threading.BoundedSemaphore(int(os.environ.get("ASK_STREAM_MAX", 1)))
+# Attente maximale d'une place avant de répondre 503 (s)
+STREAM_WAIT = float(os.environ.get("ASK_STREAM_WAIT", 5))
+
+# /health, /ready et chauffage du modèle (sauf dans le superviseur du reloader)
+init_app(app, LAZY_MODELS, warm_up=serving_process(__name__ == "__main__", DEBUG))
 
 @app.route("/ask", methods=["POST"])
 def ask():
     try:
         # Récupérer la question depuis la requête
         user_input = request.json["question"]
-        
-        # Générer une réponse
-        inputs = tokenizer.encode(user_input, return_tensors="pt")
-        outputs = model.generate(inputs, max_length=150, num_return_sequences=1)
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        return jsonify({"response": response})
+        if not user_input.strip():
+            return jsonify({"error": "Question vide"}), 400
+
+        # Réponse en flux, token par token
+        fmt = stream_format(request.json)
+        if fmt:
+            return stream_answer(user_input, fmt)
+
+        # Réponse en cache (même question ou question très proche), sinon
+        # générée avec les questions simultanées
+        answer, vector = cached_answer(user_input)
+        cached = answer is not None
+        if not cached:
+            answer = ASK_BATCHER.submit(user_input)
+            remember_answer(user_input, answer, vector)
+
+        return jsonify({"response": prompt_text(user_input) + answer, "cached": cached})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5006)
-
+    app.run(debug=DEBUG, port=5006, threaded=True)
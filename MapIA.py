@@ -3,7 +3,6 @@ from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import os
 import joblib
-import pandas as pd
 import numpy as np
 import pdfplumber
 import time
@@ -11,7 +10,6 @@ import threading
 from werkzeug.utils import secure_filename
 import logging
 import json
-import torch
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 
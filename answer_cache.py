@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Cache des réponses de /ask.
+
+Deux niveaux :
+
+- exact : question normalisée (casse, accents, espaces) -> réponse, dans un
+  TTLCache (ou SQLiteCache partagé entre workers) de ttl_cache ;
+- sémantique (optionnel) : plongement de la question (moyenne des états
+  cachés du même GPT-2) comparé par similarité cosinus à ceux des questions
+  déjà traitées, dans une matrice NumPy de taille bornée (LRU + TTL).
+
+Les états cachés de GPT-2 sont très anisotropes : bruts, deux questions sans
+rapport dépassent souvent 0.95 de similarité cosinus. Les plongements sont
+donc centrés (moyenne d'un corpus de questions de référence) avant d'être
+normalisés, et le seuil est fixé à partir de paires mesurées (paraphrases et
+questions différentes, voir calibrate_threshold).
+
+Les entrées sont versionnées par les poids du modèle : un changement des
+fichiers de models/gabon_gpt invalide tout.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+def weights_version(model_path):
+    """Empreinte (nom, taille, date) des fichiers du modèle."""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(model_path)):
+        for name in sorted(files):
+            st = os.stat(os.path.join(root, name))
+            digest.update(f"{os.path.relpath(os.path.join(root, name), model_path)}"
+                          f":{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+def load_pairs(path):
+    """
+    Paires de calibration : {"paraphrases": [[q1, q2], ...],
+    "different": [[q1, q2], ...]}.
+    """
+    with open(path, 'r', encoding='utf-8') as fh:
+        data = json.load(fh)
+    return data['paraphrases'], data['different']
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) or 1.0))
+
+def calibrate_threshold(paraphrase_scores, different_scores, margin=0.02):
+    """
+    Seuil juste au-dessus de la plus forte similarité entre questions
+    différentes (aucun faux positif sur les paires mesurées), et part des
+    paraphrases qu'il reconnaît encore. Un seuil > 1 ne reconnaît rien.
+    """
+    threshold = max(different_scores) + margin
+    recall = float(np.mean(np.asarray(paraphrase_scores) >= threshold))
+    return threshold, recall
+
+class SemanticIndex:
+    """
+    Index des plongements de questions : recherche du plus proche voisin
+    par produit scalaire sur des vecteurs centrés puis normalisés, en une
+    opération matricielle. Sans centre (calibrate), les vecteurs ne sont
+    que normalisés.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400.0, threshold=0.95, version=None, center=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = version
+        self.center = center
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._vectors = None
+        self._answers = [None] * self.max_entries
+        self._expires = np.zeros(self.max_entries)
+        self._last_used = np.zeros(self.max_entries)
+        self._size = 0
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._clear()
+
+    def calibrate(self, center, threshold):
+        """Nouveau centre et nouveau seuil ; les entrées existantes sont vidées."""
+        with self._lock:
+            self.center = np.asarray(center, dtype=np.float32).ravel()
+            self.threshold = threshold
+            self._clear()
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if self.center is not None:
+            vector = vector - self.center
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, vector):
+        """Réponse de la question la plus proche si sa similarité dépasse le seuil."""
+        with self._lock:
+            if not self._size:
+                return None
+            query = self._normalize(vector)
+            now = time.monotonic()
+            scores = self._vectors[:self._size] @ query
+            scores[self._expires[:self._size] < now] = -np.inf
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                return None
+            self._last_used[best] = now
+            return self._answers[best]
+
+    def add(self, vector, answer):
+        with self._lock:
+            vector = self._normalize(vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            now = time.monotonic()
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Entrée expirée, sinon la moins récemment utilisée
+                expired = np.flatnonzero(self._expires < now)
+                slot = int(expired[0]) if len(expired) else int(self._last_used.argmin())
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching pour l'inférence.
+
+Les requêtes concurrentes déposent leur entrée dans une file ; un thread
+unique les regroupe pendant une courte fenêtre (ou jusqu'à une taille
+maximale), appelle le modèle une seule fois sur le lot, puis rend à chaque
+appelant son propre résultat.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    batch_fn : callable(list d'entrées) -> list de résultats, même longueur
+    et même ordre. Une exception levée par batch_fn est propagée à tous les
+    appelants du lot.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=3.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Démarrage paresseux, et redémarrage après un fork (le thread du
+        # parent n'existe pas dans le processus enfant).
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit_async(self, item):
+        """Dépose une entrée et retourne un Future."""
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def submit(self, item, timeout=None):
+        """Dépose une entrée et attend son résultat."""
+        return self.submit_async(item).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: {len(results)} résultats pour un lot de {len(batch)}"
+                    )
+            except Exception as e:
+                logger.error("❌ Erreur lot %s (%d entrées): %s", self.name, len(batch), e)
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
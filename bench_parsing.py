@@ -0,0 +1,120 @@
+"""
+Benchmark report_parser against the two parsers it replaced.
+
+Builds a large synthetic report (filler lines with CITY / COORDINATES /
+DANGER ZONE markers sprinkled in, some malformed), checks that the new
+parser returns the same city data as train.py's, and prints the best time
+of each parser.
+
+    python bench_parsing.py --lines 200000 --repeat 5
+"""
+
+import argparse
+import logging
+import random
+import time
+
+from report_parser import parse_city_data
+
+# Frozen copies of the previous implementations, kept only for comparison
+
+def legacy_train_parse(text):
+    """parse_city_data from train.py (stripped fields, 'Unknown' default)."""
+    data = {'city_name': 'Unknown', 'coordinates': {'lat': 0, 'lon': 0}, 'dangerous_areas': []}
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if "CITY:" in line:
+            data['city_name'] = line.split("CITY:")[1].strip()
+        elif "COORDINATES:" in line:
+            try:
+                coords = line.split("COORDINATES:")[1].strip().split(',')
+                data['coordinates']['lat'] = float(coords[0])
+                data['coordinates']['lon'] = float(coords[1])
+            except (ValueError, IndexError):
+                pass
+        elif "DANGER ZONE:" in line:
+            try:
+                parts = line.split("DANGER ZONE:")[1].strip().split(';')
+                if len(parts) >= 6:
+                    data['dangerous_areas'].append({
+                        'name': parts[0].strip(), 'lat': float(parts[1]), 'lon': float(parts[2]),
+                        'radius': float(parts[3]), 'level': parts[4].strip(),
+                        'description': parts[5].strip()})
+            except (ValueError, IndexError):
+                pass
+    return data
+
+def legacy_mapia_parse(text):
+    """parse_city_data from mapIA.py (unstripped fields, '' default)."""
+    data = {'dangerous_areas': [], 'city_name': '', 'coordinates': {'lat': 0, 'lon': 0}}
+    for line in text.split('\n'):
+        if 'CITY:' in line:
+            data['city_name'] = line.split('CITY:')[1].strip()
+        elif 'COORDINATES:' in line:
+            coords = line.split('COORDINATES:')[1].strip().split(',')
+            if len(coords) >= 2:
+                try:
+                    data['coordinates']['lat'] = float(coords[0])
+                    data['coordinates']['lon'] = float(coords[1])
+                except ValueError:
+                    pass
+        elif 'DANGER ZONE:' in line:
+            parts = line.split('DANGER ZONE:')[1].strip().split(';')
+            if len(parts) >= 6:
+                try:
+                    data['dangerous_areas'].append({
+                        'name': parts[0], 'lat': float(parts[1]), 'lon': float(parts[2]),
+                        'radius': float(parts[3]), 'level': parts[4], 'description': parts[5]})
+                except (ValueError, IndexError):
+                    pass
+    return data
+
+def synthetic_report(lines, zone_ratio=0.05, seed=0):
+    rng = random.Random(seed)
+    out = ["CITY: Libreville", "COORDINATES: 0.4162, 9.4673"]
+    for i in range(lines):
+        r = rng.random()
+        if r < zone_ratio:
+            out.append(f"DANGER ZONE: Z{i};{0.4 + rng.random() / 100:.6f};{9.45 + rng.random() / 100:.6f};"
+                       f"{rng.randint(100, 800)};{rng.choice(['Low', 'Medium', 'High'])};zone {i}")
+        elif r < zone_ratio * 1.1:
+            out.append(f"DANGER ZONE: broken;{i}")  # too few fields
+        else:
+            out.append(f"Section {i}: traffic, lighting and public services remain stable this month.")
+    return "\n".join(out)
+
+def best_time(fn, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the city report parsers.')
+    parser.add_argument('--lines', type=int, default=200000, help='Lines in the synthetic report')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per parser (best is kept)')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    text = synthetic_report(args.lines)
+    print(f"Synthetic report: {args.lines} lines, {len(text) / 1e6:.1f} MB")
+
+    results = {}
+    for name, fn in (('train.py (legacy)', legacy_train_parse),
+                     ('mapIA.py (legacy)', legacy_mapia_parse),
+                     ('report_parser', parse_city_data)):
+        elapsed, results[name] = best_time(fn, text, args.repeat)
+        zones = len(results[name]['dangerous_areas'])
+        print(f"{name:20s} {elapsed * 1000:8.1f} ms  {zones} zones")
+
+    reference = results['train.py (legacy)']
+    for key in ('city_name', 'coordinates', 'dangerous_areas'):
+        assert results['report_parser'][key] == reference[key], f"{key} differs from train.py"
+    print("report_parser output matches train.py")
+
+if __name__ == '__main__':
+    main()
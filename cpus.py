@@ -0,0 +1,14 @@
+"""CPU count helper shared by the services that size thread and process pools."""
+
+import os
+
+def available_cpus():
+    """
+    CPUs this process may run on: the affinity mask (cgroup / taskset
+    limits) where the platform has one, else os.cpu_count(). macOS and
+    Windows have no os.sched_getaffinity.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
@@ -0,0 +1,200 @@
+"""
+Slippy-map (XYZ, Web Mercator) tiles of the danger-zone probability.
+
+A tile is rendered by running the model once over its whole pixel grid
+(optionally sampled coarser and upscaled) and colouring each pixel by its
+danger probability. Rendered tiles are written under
+model_cache/tiles/<model version>/<z>/<x>/<y>.png, so a new model gets a
+fresh pyramid and older ones are removed.
+
+Only tiles that overlap a city of a CityEnsemble are stored: blank tiles
+(anywhere else, or when there is no model) are served from the shared
+EMPTY_TILE, so walking tile coordinates cannot fill the disk. The stored
+pyramid is also capped at max_tiles; past it, the oldest tiles are evicted.
+"""
+
+import io
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+from PIL import Image
+
+from danger_zones import CityEnsemble
+
+logger = logging.getLogger('MapIA-Tiles')
+
+TILE_SIZE = 256
+MAX_ZOOM = 20
+MAX_TILES = 50000
+
+def _encode(rgba):
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG', compress_level=3)
+    return buffer.getvalue()
+
+EMPTY_TILE = _encode(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+def _tile_lat(y, z):
+    return np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * np.asarray(y, dtype=np.float64) / 2 ** z))))
+
+def tile_bounds(z, x, y):
+    """[min_lat, min_lon, max_lat, max_lon] covered by tile (z, x, y)."""
+    n = 2 ** z
+    return [float(_tile_lat(y + 1, z)), x / n * 360.0 - 180.0,
+            float(_tile_lat(y, z)), (x + 1) / n * 360.0 - 180.0]
+
+def tile_for(lat, lon, z):
+    """(x, y) of the tile containing (lat, lon) at zoom z."""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_grid(z, x, y, samples=TILE_SIZE):
+    """[lat, lon] of the centres of a samples x samples grid over the tile, row-major from north."""
+    offsets = (np.arange(samples) + 0.5) / samples
+    lats = _tile_lat(y + offsets, z)
+    lons = (x + offsets) / 2 ** z * 360.0 - 180.0
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+    return np.column_stack((lat_grid.ravel(), lon_grid.ravel()))
+
+def colorize(danger):
+    """RGBA image from a 2-D danger probability array: transparent when safe, yellow to red otherwise."""
+    danger = np.clip(danger, 0.0, 1.0)
+    rgba = np.empty(danger.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (220 * (1.0 - danger)).astype(np.uint8)
+    rgba[..., 2] = 0
+    rgba[..., 3] = (200 * np.clip((danger - 0.2) / 0.8, 0.0, 1.0)).astype(np.uint8)
+    return rgba
+
+def render_tile(model, z, x, y, samples=TILE_SIZE):
+    """PNG bytes of tile (z, x, y); a single predict_proba call over the sample grid."""
+    if model is None:
+        return EMPTY_TILE
+    if isinstance(model, CityEnsemble) and not model.intersects(tile_bounds(z, x, y)):
+        return EMPTY_TILE
+    proba = model.predict_proba(tile_grid(z, x, y, samples))
+    danger_col = np.flatnonzero(np.asarray(model.classes_) == 1)
+    if len(danger_col) == 0:
+        return EMPTY_TILE
+    danger = proba[:, danger_col[0]].reshape(samples, samples)
+    if not danger.any():
+        return EMPTY_TILE
+    image = colorize(danger)
+    if samples != TILE_SIZE:
+        image = np.asarray(Image.fromarray(image, 'RGBA').resize((TILE_SIZE, TILE_SIZE),
+                                                                 Image.BILINEAR))
+    return _encode(image)
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+class TileCache:
+    """On-disk tile pyramid for one model version at a time, at most max_tiles tiles."""
+
+    def __init__(self, directory, samples=TILE_SIZE, max_tiles=MAX_TILES):
+        self.directory = directory
+        self.samples = samples
+        self.max_tiles = max_tiles
+        self._counts = {}  # version -> tiles on disk, counted on first write
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, version, z, x, y):
+        return os.path.join(self.directory, str(version), str(z), str(x), f"{y}.png")
+
+    def get(self, model, version, z, x, y):
+        """Tile bytes, rendered on a miss and stored when it covers a city."""
+        path = self._path(version, z, x, y)
+        try:
+            with open(path, 'rb') as fh:
+                return fh.read()
+        except FileNotFoundError:
+            pass
+        data = render_tile(model, z, x, y, self.samples)
+        # render_tile returns EMPTY_TILE itself outside the city bboxes; a
+        # legacy single forest has no bboxes, its tiles are never stored
+        if data is EMPTY_TILE or not isinstance(model, CityEnsemble):
+            return data
+        self._write(path, data)
+        self._count_write(version)
+        return data
+
+    def _count_write(self, version):
+        with self._lock:
+            count = self._counts.get(version)
+            if count is None:
+                count = len(self._tiles(version))
+            self._counts[version] = count + 1
+            over = self._counts[version] > self.max_tiles
+        if over:
+            self.prune(version)
+
+    def _tiles(self, version):
+        tiles = []
+        for root, _, files in os.walk(os.path.join(self.directory, str(version))):
+            tiles.extend(os.path.join(root, name) for name in files if name.endswith('.png'))
+        return tiles
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def prune(self, version):
+        """
+        Remove the pyramids of every other model version, and the oldest
+        tiles of this one beyond 90% of max_tiles.
+        """
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and entry.name != str(version):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        with self._lock:
+            for other in [v for v in self._counts if v != version]:
+                del self._counts[other]
+            tiles = self._tiles(version)
+            if len(tiles) > self.max_tiles:
+                keep = int(self.max_tiles * 0.9)
+                tiles.sort(key=_mtime)
+                for path in tiles[:len(tiles) - keep]:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass  # removed by another worker
+                logger.info(f"Evicted {len(tiles) - keep} tile(s) of model version {version}")
+                tiles = tiles[len(tiles) - keep:]
+            self._counts[version] = len(tiles)
+
+    def prewarm(self, model, version, bboxes, zooms):
+        """Render every tile covering the given [min_lat, min_lon, max_lat, max_lon] boxes."""
+        rendered = 0
+        for z in zooms:
+            for min_lat, min_lon, max_lat, max_lon in bboxes:
+                x0, y0 = tile_for(max_lat, min_lon, z)
+                x1, y1 = tile_for(min_lat, max_lon, z)
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        self.get(model, version, z, x, y)
+                        rendered += 1
+        logger.info(f"Pre-warmed {rendered} tile(s) for model version {version}")
+        return rendered
@@ -0,0 +1,269 @@
+"""Danger-zone geometry helpers shared by the MapIA training and prediction code."""
+
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import ConvexHull, cKDTree
+
+# Rough conversion used throughout MapIA: 1 degree ~ 111 km
+METERS_PER_DEGREE = 111000.0
+
+def grid_around(lat, lon, extent=0.01, steps=20):
+    """
+    Regular grid of [lat, lon] points centred on (lat, lon).
+
+    The grid spans +/- extent degrees on each axis with `steps` points per
+    half side, i.e. (2 * steps + 1) ** 2 points (41x41 for the defaults).
+    """
+    offsets = np.linspace(-extent, extent, 2 * steps + 1)
+    lat_grid, lon_grid = np.meshgrid(lat + offsets, lon + offsets, indexing='ij')
+    return np.column_stack((lat_grid.ravel(), lon_grid.ravel()))
+
+def zone_arrays(dangerous_areas):
+    """Centres (K, 2) and radii in degrees (K,) of parsed danger areas."""
+    if not dangerous_areas:
+        return np.empty((0, 2)), np.empty(0)
+    centers = np.array([[a['lat'], a['lon']] for a in dangerous_areas], dtype=np.float64)
+    radii = np.array([a['radius'] for a in dangerous_areas], dtype=np.float64) / METERS_PER_DEGREE
+    return centers, radii
+
+def label_points(points, dangerous_areas):
+    """
+    Label each point 1 if it falls inside any danger area, else 0.
+
+    Points are indexed once in a KD-tree and every zone runs a single
+    radius query against it, so the cost is O((P + K) log P + hits)
+    instead of O(P * K) distance checks.
+    """
+    labels = np.zeros(len(points), dtype=np.uint8)
+    centers, radii = zone_arrays(dangerous_areas)
+    if len(points) == 0 or len(centers) == 0:
+        return labels
+
+    tree = cKDTree(points)
+    hits = tree.query_ball_point(centers, r=radii, return_sorted=False)
+    inside = np.concatenate([np.asarray(zone_hits, dtype=np.int64) for zone_hits in hits])
+    labels[inside] = 1
+    return labels
+
+def danger_levels(probability):
+    """Map danger probabilities to the Low / Medium / High levels shown on the map."""
+    return np.where(probability >= 0.8, 'High', np.where(probability >= 0.65, 'Medium', 'Low'))
+
+def raster_zones(model, lat, lon, extent=0.01, steps=50, threshold=0.5):
+    """
+    Predict danger over a grid around (lat, lon) and merge it into zones.
+
+    The whole (2 * steps + 1) ** 2 grid goes through one predict_proba
+    call; cells above `threshold` are grouped into 8-connected components
+    and each component becomes one zone with its mean and peak probability,
+    an equal-area circle (centre, radius in meters) and the convex outline
+    of its cells as a [[lat, lon], ...] polygon.
+    """
+    points = grid_around(lat, lon, extent=extent, steps=steps)
+    side = 2 * steps + 1
+    proba = model.predict_proba(points)
+    danger_col = np.flatnonzero(np.asarray(model.classes_) == 1)
+    if len(danger_col) == 0:
+        return []
+    danger = proba[:, danger_col[0]].reshape(side, side)
+
+    components, count = ndimage.label(danger > threshold, structure=np.ones((3, 3)))
+    if count == 0:
+        return []
+    index = np.arange(1, count + 1)
+    cells = ndimage.sum_labels(np.ones_like(danger), components, index)
+    mean = ndimage.mean(danger, components, index)
+    peak = ndimage.maximum(danger, components, index)
+    # Probability-weighted centroids, in grid coordinates
+    rows, cols = np.array(ndimage.center_of_mass(danger, components, index)).T
+
+    cell = extent / steps
+    lat0, lon0 = lat - extent, lon - extent
+    radii = np.sqrt(cells / np.pi) * cell * METERS_PER_DEGREE
+    levels = danger_levels(mean)
+    corners = np.array([[-0.5, -0.5], [-0.5, 0.5], [0.5, 0.5], [0.5, -0.5]])
+
+    zones = []
+    for k, cell_index in enumerate(ndimage.find_objects(components)):
+        grid = np.argwhere(components[cell_index] == k + 1)
+        grid += [cell_index[0].start, cell_index[1].start]
+        outline = (grid[:, None, :] + corners[None, :, :]).reshape(-1, 2)
+        hull = outline[ConvexHull(outline).vertices]
+        zones.append({
+            'lat': float(lat0 + rows[k] * cell),
+            'lon': float(lon0 + cols[k] * cell),
+            'radius': float(radii[k]),
+            'probability': float(mean[k]),
+            'max_probability': float(peak[k]),
+            'level': str(levels[k]),
+            'polygon': [[float(lat0 + r * cell), float(lon0 + c * cell)] for r, c in hull],
+        })
+    return zones
+
+class PointStore:
+    """
+    Append-only on-disk store of labeled training points.
+
+    points.f32 holds (N, 2) float32 [lat, lon] rows and labels.u8 the
+    matching uint8 labels. manifest.json records the committed row count and,
+    for every ingested PDF (by content digest), its city key and row range.
+    The manifest is replaced atomically after the arrays are appended and
+    synced, so a crash mid-append only leaves uncommitted bytes that are
+    truncated on the next open.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.points_path = os.path.join(directory, 'points.f32')
+        self.labels_path = os.path.join(directory, 'labels.u8')
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+        self._truncate_uncommitted()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {'rows': 0, 'files': {}}
+
+    def _truncate_uncommitted(self):
+        rows = self.manifest['rows']
+        for path, row_bytes in ((self.points_path, 8), (self.labels_path, 1)):
+            if os.path.exists(path) and os.path.getsize(path) > rows * row_bytes:
+                with open(path, 'r+b') as fh:
+                    fh.truncate(rows * row_bytes)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Exclusive inter-process lock on the store (training may run in
+        several worker processes); the manifest is re-read on entry so
+        appends made by other processes are visible.
+        """
+        with open(os.path.join(self.directory, '.lock'), 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with self._lock:
+                    self.manifest = self._load_manifest()
+                    self._truncate_uncommitted()
+                yield self
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def has(self, digest):
+        return digest in self.manifest['files']
+
+    def append(self, digest, city, points, labels):
+        """Append one file's labeled grid and commit it to the manifest."""
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        labels = np.ascontiguousarray(labels, dtype=np.uint8)
+        with self._lock:
+            start = self.manifest['rows']
+            for path, arr in ((self.points_path, points), (self.labels_path, labels)):
+                with open(path, 'ab') as fh:
+                    arr.tofile(fh)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            manifest = {
+                'rows': start + len(labels),
+                'files': dict(self.manifest['files']),
+            }
+            manifest['files'][digest] = {'city': city, 'start': start, 'stop': start + len(labels)}
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(manifest, fh)
+            os.replace(tmp_path, self.manifest_path)
+            self.manifest = manifest
+
+    def cities(self):
+        return sorted({entry['city'] for entry in self.manifest['files'].values()})
+
+    def city_arrays(self, city):
+        """All committed (points, labels) rows of one city, read via memmap."""
+        ranges = sorted((e['start'], e['stop']) for e in self.manifest['files'].values()
+                        if e['city'] == city)
+        rows = self.manifest['rows']
+        if not ranges or rows == 0:
+            return np.empty((0, 2), dtype=np.float32), np.empty(0, dtype=np.uint8)
+        points = np.memmap(self.points_path, dtype=np.float32, mode='r', shape=(rows, 2))
+        labels = np.memmap(self.labels_path, dtype=np.uint8, mode='r', shape=(rows,))
+        index = np.concatenate([np.arange(a, b) for a, b in ranges])
+        return np.asarray(points[index]), np.asarray(labels[index])
+
+class CityEnsemble:
+    """
+    Danger-zone model made of one classifier per city.
+
+    Each point is routed to the sub-model of the city whose training bbox
+    contains it (nearest city centre when several do); points outside every
+    city are reported as safe. Exposes the predict / predict_proba subset
+    of the scikit-learn classifier API used by MapIA.
+    """
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, submodels=None):
+        # city -> (classifier, bbox [min_lat, min_lon, max_lat, max_lon])
+        self.submodels = dict(submodels or {})
+
+    def with_submodel(self, city, model, bbox):
+        """Copy of this ensemble with one city added or replaced."""
+        submodels = dict(self.submodels)
+        submodels[city] = (model, tuple(float(v) for v in bbox))
+        return CityEnsemble(submodels)
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        proba = np.zeros((len(X), 2))
+        proba[:, 0] = 1.0
+        if not self.submodels or len(X) == 0:
+            return proba
+
+        cities = list(self.submodels)
+        bboxes = np.array([self.submodels[c][1] for c in cities])
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2.0
+        inside = ((X[:, None, 0] >= bboxes[None, :, 0]) & (X[:, None, 0] <= bboxes[None, :, 2])
+                  & (X[:, None, 1] >= bboxes[None, :, 1]) & (X[:, None, 1] <= bboxes[None, :, 3]))
+        dist = ((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        dist[~inside] = np.inf
+        owner = dist.argmin(axis=1)
+        owner[~inside.any(axis=1)] = -1
+
+        for k, city in enumerate(cities):
+            rows = np.flatnonzero(owner == k)
+            if len(rows) == 0:
+                continue
+            model = self.submodels[city][0]
+            sub = model.predict_proba(X[rows])
+            danger_col = np.flatnonzero(model.classes_ == 1)
+            danger = sub[:, danger_col[0]] if len(danger_col) else np.zeros(len(rows))
+            proba[rows, 1] = danger
+            proba[rows, 0] = 1.0 - danger
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def intersects(self, bbox):
+        """Whether any city bbox overlaps [min_lat, min_lon, max_lat, max_lon]."""
+        return any(b[0] <= bbox[2] and bbox[0] <= b[2] and b[1] <= bbox[3] and bbox[1] <= b[3]
+                   for _, b in self.submodels.values())
+
+    def city_bboxes(self):
+        """city -> [min_lat, min_lon, max_lat, max_lon] of its training points."""
+        return {city: list(bbox) for city, (_, bbox) in self.submodels.items()}
+
+    def city_centers(self):
+        """city -> (lat, lon) centre of its training bbox."""
+        return {city: ((bbox[0] + bbox[2]) / 2.0, (bbox[1] + bbox[3]) / 2.0)
+                for city, (_, bbox) in self.submodels.items()}
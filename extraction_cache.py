@@ -0,0 +1,168 @@
+"""
+Content-addressed on-disk cache for PDF extraction results.
+
+Entries are keyed by the SHA-256 of the PDF bytes, so the same report is
+only extracted once whatever its file name. Two kinds of entries live under
+model_cache/extract/:
+
+- <digest>.<EXTRACTOR_VERSION>.txt   raw extracted text
+- <digest>.<EXTRACTOR_VERSION>.pages same text with pages separated by form
+                                     feeds, written and read page by page
+- <digest>.<parser_version>.json     parsed output of a given parser
+
+A parser change is expressed by bumping its version string: old entries
+stop matching and age out. The directory is kept under a size budget by
+evicting the least recently used entries (mtime is refreshed on every hit).
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger('MapIA-Cache')
+
+CACHE_DIR = os.environ.get('EXTRACT_CACHE_DIR', os.path.join('model_cache', 'extract'))
+CACHE_MAX_BYTES = int(os.environ.get('EXTRACT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Bump when the way text is pulled out of PDFs changes
+EXTRACTOR_VERSION = 'pdfplumber-1'
+
+PAGE_SEPARATOR = '\f'
+
+def file_digest(path_or_stream, chunk_size=1 << 20):
+    """SHA-256 of a file path or a seekable binary stream (rewound afterwards)."""
+    digest = hashlib.sha256()
+    if isinstance(path_or_stream, (str, os.PathLike)):
+        with open(path_or_stream, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b''):
+                digest.update(chunk)
+    else:
+        start = path_or_stream.tell()
+        for chunk in iter(lambda: path_or_stream.read(chunk_size), b''):
+            digest.update(chunk)
+        path_or_stream.seek(start)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest, version, ext):
+        return os.path.join(self.directory, f"{digest}.{version}.{ext}")
+
+    def _read(self, path, loader):
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                value = loader(fh)
+            os.utime(path)  # LRU touch
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+    def _write(self, path, dumper):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                dumper(fh)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_text(self, digest):
+        return self._read(self._path(digest, EXTRACTOR_VERSION, 'txt'), lambda fh: fh.read())
+
+    def put_text(self, digest, text):
+        self._write(self._path(digest, EXTRACTOR_VERSION, 'txt'), lambda fh: fh.write(text))
+
+    def open_pages(self, digest, chunk_size=1 << 16):
+        """Iterator over the cached pages of a PDF (one page in memory at a time), or None."""
+        path = self._path(digest, EXTRACTOR_VERSION, 'pages')
+        try:
+            fh = open(path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+
+        def pages():
+            with fh:
+                pending = ''
+                for chunk in iter(lambda: fh.read(chunk_size), ''):
+                    *complete, pending = (pending + chunk).split(PAGE_SEPARATOR)
+                    yield from complete
+                yield pending
+        return pages()
+
+    @contextlib.contextmanager
+    def page_writer(self, digest):
+        """
+        Context manager yielding write(page_text) to stream a PDF's pages into
+        the cache; the entry only appears if the block completes.
+        """
+        path = self._path(digest, EXTRACTOR_VERSION, 'pages')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                pages = [0]
+
+                def write(text):
+                    if pages[0]:
+                        fh.write(PAGE_SEPARATOR)
+                    fh.write(text.replace(PAGE_SEPARATOR, ' '))
+                    pages[0] += 1
+                yield write
+            if not pages[0]:
+                # A document without pages has nothing to iterate over
+                self._remove(tmp_path)
+                return
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def get_parsed(self, digest, parser_version):
+        return self._read(self._path(digest, parser_version, 'json'), json.load)
+
+    def put_parsed(self, digest, parser_version, value):
+        self._write(self._path(digest, parser_version, 'json'), lambda fh: json.dump(value, fh))
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.is_file() or entry.name.endswith('.tmp'):
+                        continue
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
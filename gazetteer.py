@@ -0,0 +1,215 @@
+"""
+Offline gazetteer used by MapIA to resolve city names.
+
+Places are loaded from a local GeoNames dump (cities500.txt, cities15000.txt,
+allCountries.txt... tab-separated, one place per line) into parallel arrays.
+Every name and alternate name of a place is normalised (case, accents,
+punctuation, whitespace) and stored in one sorted key list with the matching
+place index, so exact and prefix lookups are a binary search, O(log n).
+Without a dump a small built-in list of major cities is used.
+"""
+
+import bisect
+import difflib
+import logging
+import re
+import threading
+
+import numpy as np
+
+from ttl_cache import normalize_key
+
+logger = logging.getLogger('MapIA-Gazetteer')
+
+# GeoNames columns used here
+_NAME, _ASCII_NAME, _ALTERNATES, _LAT, _LON, _FEATURE_CLASS, _COUNTRY, _POPULATION = (
+    1, 2, 3, 4, 5, 6, 8, 14)
+
+_PUNCTUATION = re.compile(r"[-'’`.,()/]+")
+
+# (name, lat, lon, country, population, alternate names)
+BUILTIN_PLACES = [
+    ('Paris', 48.8566, 2.3522, 'FR', 2138551, ()),
+    ('London', 51.5074, -0.1278, 'GB', 8961989, ('Londres',)),
+    ('New York', 40.7128, -74.0060, 'US', 8804190, ('New York City', 'NYC')),
+    ('Tokyo', 35.6762, 139.6503, 'JP', 13960000, ()),
+    ('Berlin', 52.5200, 13.4050, 'DE', 3644826, ()),
+    ('Moscow', 55.7558, 37.6173, 'RU', 12506468, ('Moscou', 'Moskva')),
+    ('Beijing', 39.9042, 116.4074, 'CN', 21540000, ('Pékin', 'Peking')),
+    ('Madrid', 40.4168, -3.7038, 'ES', 3223334, ()),
+    ('Rome', 41.9028, 12.4964, 'IT', 2872800, ('Roma',)),
+    ('Sydney', -33.8688, 151.2093, 'AU', 5312163, ()),
+    ('Cairo', 30.0444, 31.2357, 'EG', 9539673, ('Le Caire',)),
+    ('Mumbai', 19.0760, 72.8777, 'IN', 12442373, ('Bombay',)),
+    ('Rio de Janeiro', -22.9068, -43.1729, 'BR', 6747815, ('Rio',)),
+    ('Delhi', 28.7041, 77.1025, 'IN', 11034555, ('New Delhi',)),
+    ('Istanbul', 41.0082, 28.9784, 'TR', 15462452, ()),
+    ('Libreville', 0.4162, 9.4673, 'GA', 703904, ()),
+]
+
+def place_key(text):
+    """Normalised lookup key: 'Saint-Étienne' and 'saint etienne' match."""
+    return normalize_key(_PUNCTUATION.sub(' ', str(text)))
+
+class Gazetteer:
+    def __init__(self, places):
+        names, lats, lons, countries, populations = [], [], [], [], []
+        keys, ids = [], []
+        for index, (name, lat, lon, country, population, alternates) in enumerate(places):
+            names.append(name)
+            lats.append(lat)
+            lons.append(lon)
+            countries.append(country)
+            populations.append(population)
+            for key in {place_key(n) for n in (name, *alternates)}:
+                if key:
+                    keys.append(key)
+                    ids.append(index)
+
+        self.names = names
+        self.countries = countries
+        self.lats = np.array(lats, dtype=np.float64)
+        self.lons = np.array(lons, dtype=np.float64)
+        self.populations = np.array(populations, dtype=np.int64)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = [keys[i] for i in order]
+        self._ids = np.array([ids[i] for i in order], dtype=np.int32)
+
+    @classmethod
+    def from_geonames(cls, path, feature_classes=('P',), min_population=0):
+        """
+        Load a GeoNames dump, keeping populated places by default.
+        Malformed rows (bad numbers) are skipped and counted in the log.
+        """
+        skipped = 0
+
+        def places():
+            nonlocal skipped
+            with open(path, 'r', encoding='utf-8') as fh:
+                for line in fh:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) <= _POPULATION:
+                        continue
+                    if feature_classes and fields[_FEATURE_CLASS] not in feature_classes:
+                        continue
+                    try:
+                        population = int(fields[_POPULATION] or 0)
+                        lat, lon = float(fields[_LAT]), float(fields[_LON])
+                    except ValueError:
+                        skipped += 1
+                        continue
+                    if population < min_population:
+                        continue
+                    alternates = [fields[_ASCII_NAME]]
+                    alternates.extend(n for n in fields[_ALTERNATES].split(',') if len(n) <= 64)
+                    yield (fields[_NAME], lat, lon, fields[_COUNTRY], population, alternates)
+        gazetteer = cls(places())
+        if skipped:
+            logger.warning(f"Skipped {skipped} malformed rows in {path}")
+        logger.info(f"Loaded {len(gazetteer)} places ({len(gazetteer._keys)} names) from {path}")
+        return gazetteer
+
+    def __len__(self):
+        return len(self.names)
+
+    def place(self, index):
+        return {
+            'name': self.names[index],
+            'lat': float(self.lats[index]),
+            'lon': float(self.lons[index]),
+            'country': self.countries[index],
+            'population': int(self.populations[index]),
+        }
+
+    def _range(self, key, prefix=False):
+        lo = bisect.bisect_left(self._keys, key)
+        if prefix:
+            hi = bisect.bisect_left(self._keys, key + '\U0010ffff', lo)
+        else:
+            hi = bisect.bisect_right(self._keys, key, lo)
+        return lo, hi
+
+    def _ranked(self, ids, limit):
+        """Unique place ids, most populated first."""
+        ids = np.unique(ids)
+        ids = ids[np.argsort(-self.populations[ids], kind='stable')]
+        return [self.place(i) for i in ids[:limit]]
+
+    def lookup(self, name):
+        """Best (most populated) place with exactly this name, else the closest spelling, else None."""
+        key = place_key(name)
+        if not key:
+            return None
+        lo, hi = self._range(key)
+        if hi > lo:
+            return self._ranked(self._ids[lo:hi], 1)[0]
+        matches = self.fuzzy(name, limit=1)
+        return matches[0] if matches else None
+
+    def prefix(self, text, limit=10, max_scan=5000):
+        """Places with a name starting with `text`, most populated first."""
+        key = place_key(text)
+        if not key:
+            return []
+        lo, hi = self._range(key, prefix=True)
+        return self._ranked(self._ids[lo:min(hi, lo + max_scan)], limit)
+
+    def fuzzy(self, text, limit=5, cutoff=0.8, max_scan=5000):
+        """
+        Typo-tolerant match: candidates are the names sharing the first
+        two characters (one binary search), ranked by similarity.
+        """
+        key = place_key(text)
+        if len(key) < 2:
+            return []
+        lo, hi = self._range(key[:2], prefix=True)
+        hi = min(hi, lo + max_scan)
+        candidates = dict.fromkeys(self._keys[lo:hi])
+        ids = []
+        for match in difflib.get_close_matches(key, candidates, n=limit, cutoff=cutoff):
+            m_lo, m_hi = self._range(match)
+            ids.append(self._ranked(self._ids[m_lo:m_hi], 1)[0])
+        return ids
+
+    def find_in_text(self, text, max_words=4, min_population=0):
+        """
+        City mentioned in free text: the longest word n-gram that is an
+        exact place name, the most populated one on ties.
+        """
+        words = place_key(text).split()
+        for n in range(min(max_words, len(words)), 0, -1):
+            ids = []
+            for start in range(len(words) - n + 1):
+                candidate = ' '.join(words[start:start + n])
+                if n == 1 and len(candidate) < 3:
+                    continue
+                lo, hi = self._range(candidate)
+                ids.extend(self._ids[lo:hi])
+            ids = [i for i in ids if self.populations[i] >= min_population]
+            if ids:
+                return self._ranked(ids, 1)[0]
+        return None
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_gazetteer(path=None, min_population=0):
+    """
+    Shared gazetteer, loaded on first use from `path`. When the file is
+    missing or cannot be read, the built-in list is used, and kept, so a
+    bad file is not reloaded on every request.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            try:
+                if not path:
+                    raise FileNotFoundError('no gazetteer file configured')
+                _default = Gazetteer.from_geonames(path, min_population=min_population)
+            except FileNotFoundError as e:
+                logger.warning(f"Gazetteer file unavailable ({e}), using built-in cities")
+                _default = Gazetteer(BUILTIN_PLACES)
+            except Exception as e:
+                logger.error(f"Could not load gazetteer {path} ({e}), using built-in cities")
+                _default = Gazetteer(BUILTIN_PLACES)
+        return _default
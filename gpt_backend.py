@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Chargement optimisé du modèle GPT-2 de /ask pour l'inférence CPU.
+
+Backends (combinables, séparés par des virgules, ex. "int8,compile") :
+
+- eager   : modèle fp32 tel que chargé par transformers ;
+- int8    : quantification dynamique int8 des couches linéaires. Les
+            projections de GPT-2 sont des Conv1D de transformers (poids
+            transposés), que quantize_dynamic ignore : elles sont d'abord
+            converties en nn.Linear équivalentes ;
+- compile : forward compilé avec torch.compile (formes dynamiques). Un
+            TorchScript tracé fige les formes et le cache KV, incompatible
+            avec generate().
+
+Banc d'essai (tokens/s et mémoire résidente, un processus par backend) :
+
+    python gpt_backend.py bench --backends eager,int8,int8+compile --tokens 64
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import torch
+from transformers import GPT2LMHeadModel
+
+from cpus import available_cpus
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('eager', 'int8', 'compile')
+
+def parse_backend(spec):
+    """'int8,compile' ou 'int8+compile' -> {'int8', 'compile'}."""
+    parts = {p.strip() for p in spec.replace('+', ',').split(',') if p.strip()}
+    unknown = parts - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Backend inconnu : {', '.join(sorted(unknown))} (attendus : {', '.join(BACKENDS)})")
+    return parts
+
+def conv1d_to_linear(model):
+    """Remplace les Conv1D de transformers par des nn.Linear équivalentes."""
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+def quantize_int8(model):
+    quantization = getattr(torch, 'ao', torch).quantization
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('fbgemm', 'x86', 'qnnpack'):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            break
+    return quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear},
+                                         dtype=torch.qint8)
+
+def load_model(model_path, backend='eager'):
+    """Charge le modèle en mode évaluation avec le backend demandé."""
+    parts = parse_backend(backend)
+    model = GPT2LMHeadModel.from_pretrained(model_path)
+    model.eval()
+    if 'int8' in parts:
+        model = quantize_int8(model)
+    if 'compile' in parts:
+        if hasattr(torch, 'compile'):
+            model.forward = torch.compile(model.forward, dynamic=True)
+        else:
+            logger.warning("torch.compile indisponible (torch < 2.0), backend 'compile' ignoré")
+    logger.info(f"Modèle {model_path} chargé (backend {backend})")
+    return model
+
+def rss_mb():
+    """Mémoire résidente du processus, en Mo."""
+    with open('/proc/self/statm') as fh:
+        pages = int(fh.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def _bench_one(args):
+    from transformers import GPT2Tokenizer
+
+    torch.set_num_threads(args.threads or available_cpus())
+    baseline = rss_mb()
+    start = time.perf_counter()
+    model = load_model(args.model, args.backend)
+    load_s = time.perf_counter() - start
+    tokenizer = GPT2Tokenizer.from_pretrained(args.model)
+    inputs = tokenizer([args.prompt] * args.batch, return_tensors='pt')
+    generate = dict(max_new_tokens=args.tokens, min_new_tokens=args.tokens, do_sample=False,
+                    pad_token_id=tokenizer.eos_token_id)
+
+    with torch.inference_mode():
+        model.generate(**inputs, **generate)  # échauffement (et compilation)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            model.generate(**inputs, **generate)
+            timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(json.dumps({
+        'backend': args.backend,
+        'load_s': round(load_s, 2),
+        'tokens_per_s': round(args.tokens * args.batch / best, 1),
+        'latency_ms_per_token': round(best / args.tokens * 1000, 2),
+        'rss_mb': round(rss_mb(), 1),
+        'model_rss_mb': round(rss_mb() - baseline, 1),
+    }))
+
+def _bench(args):
+    rows = []
+    for backend in args.backends.split(','):
+        # Un processus par backend : mesures de mémoire indépendantes
+        cmd = [sys.executable, os.path.abspath(__file__), '_bench_one', '--backend', backend,
+               '--model', args.model, '--tokens', str(args.tokens), '--batch', str(args.batch),
+               '--repeat', str(args.repeat), '--threads', str(args.threads), '--prompt', args.prompt]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'backend':<16}{'tokens/s':>10}{'ms/token':>10}{'RSS Mo':>10}{'modèle Mo':>11}{'chargement s':>14}")
+    for row in rows:
+        print(f"{row['backend']:<16}{row['tokens_per_s']:>10}{row['latency_ms_per_token']:>10}"
+              f"{row['rss_mb']:>10}{row['model_rss_mb']:>11}{row['load_s']:>14}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backends d'inférence GPT-2 pour /ask")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('bench', '_bench_one'):
+        p = sub.add_parser(name)
+        p.add_argument('--model', default='models/gabon_gpt')
+        p.add_argument('--tokens', type=int, default=64, help='Tokens générés par essai')
+        p.add_argument('--batch', type=int, default=1)
+        p.add_argument('--repeat', type=int, default=3)
+        p.add_argument('--threads', type=int, default=0, help='0 = cœurs attribués au processus')
+        p.add_argument('--prompt', default='Quelle est la capitale du Gabon ?')
+        if name == 'bench':
+            p.add_argument('--backends', default='eager,int8,compile,int8+compile')
+        else:
+            p.add_argument('--backend', required=True)
+    args = parser.parse_args()
+    if args.command == 'bench':
+        _bench(args)
+    else:
+        _bench_one(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Background job runner for long MapIA tasks (model training).
+
+Jobs run on a bounded ProcessPoolExecutor so concurrent uploads queue up
+instead of competing for the GIL and cores. If a worker dies (OOM kill,
+segfault) the pool is broken; it is replaced on the next submission. The
+web process keeps a job table that workers update through a progress queue;
+cancellation is a flag the worker checks every time it reports progress.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger('MapIA-Jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled through the API."""
+
+def _run_job(job_id, fn, args, kwargs, events, cancel_flags):
+    """Worker-side wrapper: wires the progress reporter and runs fn."""
+    def report(stage, progress, message=None):
+        if cancel_flags.get(job_id):
+            raise JobCancelled()
+        events.put((job_id, {'stage': stage, 'progress': int(progress), 'message': message}))
+
+    events.put((job_id, {'status': RUNNING, 'started_at': time.time()}))
+    report('start', 0)
+    return fn(report, *args, **kwargs)
+
+class JobManager:
+    """
+    Submit callables as jobs and track them by id.
+
+    Job functions are called as fn(report, *args, **kwargs) in a worker
+    process and must be picklable (module-level). report(stage, progress,
+    message=None) publishes progress (0-100) and raises JobCancelled when
+    the job was cancelled. on_event(job) is called in the web process on
+    every status or progress change.
+    """
+
+    def __init__(self, max_workers=2, on_event=None, on_done=None, keep_finished=200):
+        self.max_workers = max_workers
+        self.on_event = on_event
+        self.on_done = on_done
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._manager = None
+
+    def _ensure_pool(self):
+        # Created lazily so that the pool and its manager belong to the
+        # process actually serving requests (not a pre-fork parent)
+        if self._pool is None:
+            ctx = multiprocessing.get_context()
+            self._manager = ctx.Manager()
+            self._events = self._manager.Queue()
+            self._cancel_flags = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+            threading.Thread(target=self._listen, name='jobs-events', daemon=True).start()
+
+    def _replace_broken_pool(self):
+        # Jobs of the broken pool already failed with BrokenProcessPool;
+        # the manager (events, cancel flags) is still alive and is kept
+        logger.warning("Job pool broken (a worker died), starting a new one")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                         mp_context=multiprocessing.get_context())
+
+    def submit(self, fn, *args, name=None, **kwargs):
+        with self._lock:
+            self._ensure_pool()
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'name': name or fn.__name__,
+                'status': QUEUED,
+                'stage': None,
+                'progress': 0,
+                'message': None,
+                'error': None,
+                'result': None,
+                'cancel_requested': False,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+            }
+            job_args = (_run_job, job_id, fn, args, kwargs, self._events, self._cancel_flags)
+            try:
+                future = self._pool.submit(*job_args)
+            except BrokenProcessPool:
+                self._replace_broken_pool()
+                future = self._pool.submit(*job_args)
+            self._futures[job_id] = future
+            self._prune()
+        future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+        self._notify(job_id)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the job or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in FINISHED:
+                return dict(job)
+            future = self._futures.get(job_id)
+            self._cancel_flags[job_id] = True
+            job['cancel_requested'] = True
+        # A queued job is dropped right away; a running one stops at its
+        # next progress report
+        if future is not None and future.cancel():
+            self._finish(job_id, future)
+        return self.get(job_id)
+
+    def _listen(self):
+        while True:
+            try:
+                job_id, update = self._events.get()
+            except (EOFError, OSError):
+                return  # manager shut down
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] in FINISHED:
+                    continue
+                job.update({k: v for k, v in update.items() if v is not None or k == 'message'})
+            self._notify(job_id)
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return
+            job['finished_at'] = time.time()
+            if future.cancelled():
+                job['status'] = CANCELLED
+            else:
+                error = future.exception()
+                if isinstance(error, JobCancelled):
+                    job['status'] = CANCELLED
+                elif error is not None:
+                    job['status'] = FAILED
+                    job['error'] = str(error)
+                    logger.error(f"Job {job_id} failed: {''.join(traceback.format_exception(error))}")
+                else:
+                    job['status'] = SUCCEEDED
+                    job['progress'] = 100
+                    job['result'] = future.result()
+            self._cancel_flags.pop(job_id, None)
+            self._futures.pop(job_id, None)
+            snapshot = dict(job)
+        if self.on_done is not None:
+            try:
+                self.on_done(snapshot)
+            except Exception as e:
+                logger.error(f"Job {job_id} completion hook failed: {e}")
+        self._notify(job_id)
+
+    def _notify(self, job_id):
+        if self.on_event is None:
+            return
+        job = self.get(job_id)
+        if job is not None:
+            try:
+                self.on_event(job)
+            except Exception as e:
+                logger.error(f"Job {job_id} event hook failed: {e}")
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j['status'] in FINISHED]
+        if len(finished) > self.keep_finished:
+            finished.sort(key=lambda j: j['finished_at'])
+            for job in finished[:len(finished) - self.keep_finished]:
+                del self._jobs[job['id']]
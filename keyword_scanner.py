@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Recherche de mots-clés en une seule passe sur le texte d'un document.
+
+Les mots-clés d'une langue sont compilés en une seule expression régulière
+dont les alternatives sont factorisées en trie (« dang(?:er|ereux) »), si
+bien que le moteur n'essaie à chaque position qu'un chemin par préfixe
+commun au lieu de tester chaque mot-clé l'un après l'autre. Les mots-clés
+sont reconnus comme mots entiers : les formes fléchies voulues (« vol »,
+« vols ») sont listées explicitement, le trie les factorise.
+
+Les listes de mots-clés viennent d'un fichier JSON, relu automatiquement
+dès que sa date de modification change :
+
+    {
+        "fr": {"keywords": ["danger", ...], "zone_words": ["zone", ...]},
+        "en": {"keywords": ["danger", ...], "zone_words": ["area", ...]}
+    }
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Utilisées tant qu'aucun fichier de configuration n'est trouvé
+DEFAULT_KEYWORDS = {
+    'fr': {
+        'keywords': ['danger', 'dangers', 'dangereux', 'dangereuse', 'dangereuses', 'éviter',
+                     'accident', 'accidents', 'crime', 'crimes', 'insécurité'],
+        'zone_words': ['zone', 'quartier', 'ville'],
+    },
+    'en': {
+        'keywords': ['danger', 'dangers', 'dangerous', 'avoid', 'accident', 'accidents',
+                     'crime', 'crimes', 'unsafe'],
+        'zone_words': ['zone', 'quartier', 'ville'],
+    },
+}
+
+def _trie_pattern(words):
+    """Expression régulière (sans groupe capturant) reconnaissant exactement `words`."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        end = '' in node
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if end else pattern
+
+    return build(trie)
+
+class KeywordScanner:
+    """
+    keywords : mots (ou expressions) recherchés sans tenir compte de la
+    casse, en mots entiers : « vol » ne reconnaît pas « volume ».
+    zone_words : mots qui suivent un nom de zone (« Nord zone »).
+    """
+
+    def __init__(self, keywords, zone_words):
+        self.keywords = sorted({k.strip().lower() for k in keywords if k.strip()})
+        self.zone_words = sorted({w.strip().lower() for w in zone_words if w.strip()})
+        keyword_pattern = r'\b(' + _trie_pattern(self.keywords) + r')\b'
+        zone_pattern = r'(\w+|\w+\s\w+) \s*(?:' + _trie_pattern(self.zone_words) + ')'
+        # Version tirée des expressions compilées : change avec les mots-clés
+        # comme avec les règles de correspondance
+        raw = f"{keyword_pattern}\n{zone_pattern}".encode('utf-8')
+        self.version = hashlib.sha256(raw).hexdigest()[:12]
+        self._keyword_re = re.compile(keyword_pattern) if self.keywords else None
+        self._keyword_re_i = re.compile(keyword_pattern, re.I) if self.keywords else None
+        self._zone_re = re.compile(zone_pattern, re.I) if self.zone_words else None
+
+    def scan(self, text):
+        """
+        Zones à éviter : une par ligne contenant au moins un mot-clé et un
+        nom de zone, avec les mots-clés trouvés sur la ligne.
+        """
+        zones = []
+        if self._keyword_re is None or self._zone_re is None:
+            return zones
+
+        # Recherche sur le texte en minuscules (plus rapide que re.I) tant
+        # que les positions restent celles du texte d'origine
+        haystack = text.lower()
+        keyword_re = self._keyword_re
+        if len(haystack) != len(text):
+            haystack, keyword_re = text, self._keyword_re_i
+
+        line_end = -1
+        for match in keyword_re.finditer(haystack):
+            if match.start() <= line_end:
+                continue  # ligne déjà traitée
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            line_end = text.find('\n', match.end())
+            if line_end == -1:
+                line_end = len(text)
+            line = text[line_start:line_end]
+            zone = self._zone_re.search(line)
+            if zone:
+                found = sorted({m.group(1).lower() for m in self._keyword_re_i.finditer(line)})
+                zones.append({'name': zone.group(0).strip(), 'description': line,
+                              'keywords': found})
+        return zones
+
+class KeywordRegistry:
+    """
+    Scanners par langue, reconstruits quand le fichier de configuration
+    change. Le `version` de chaque scanner identifie son jeu de mots-clés
+    (les résultats mis en cache doivent en dépendre).
+    """
+
+    def __init__(self, path=None, defaults=DEFAULT_KEYWORDS):
+        self.path = path
+        self.defaults = defaults
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._load(defaults)
+
+    def _load(self, config):
+        scanners = {}
+        for lang, entry in config.items():
+            scanners[lang] = KeywordScanner(entry.get('keywords', []), entry.get('zone_words', []))
+        # Toutes langues confondues
+        scanners['all'] = KeywordScanner(
+            [k for entry in config.values() for k in entry.get('keywords', [])],
+            [w for entry in config.values() for w in entry.get('zone_words', [])])
+        self.scanners = scanners
+
+    def _refresh(self):
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                if mtime is None:
+                    config = self.defaults
+                else:
+                    with open(self.path, 'r', encoding='utf-8') as fh:
+                        config = json.load(fh)
+                self._load(config)
+                logger.info(f"Mots-clés chargés depuis {self.path}")
+            except (OSError, ValueError, AttributeError) as e:
+                # On garde les scanners précédents plutôt que de tout casser
+                logger.error(f"Fichier de mots-clés {self.path} invalide : {e}")
+            self._mtime = mtime
+
+    def get(self, lang='all'):
+        """Scanner de la langue demandée (toutes langues si inconnue)."""
+        self._refresh()
+        scanners = self.scanners
+        return scanners.get(lang) or scanners['all']
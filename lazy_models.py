@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chargement paresseux des modèles lourds, partagé par les services.
+
+Les modèles ne sont plus chargés à l'import : chaque service déclare des
+fonctions de chargement (qui importent elles-mêmes torch, transformers,
+ultralytics...), les chauffe dans un thread en arrière-plan au démarrage,
+et le serveur répond tout de suite :
+
+- GET /health : vivant (toujours 200, sans toucher aux modèles) ;
+- GET /ready  : 200 quand tous les modèles sont chargés, 503 sinon, avec
+                l'état et la durée de chargement de chaque modèle.
+
+Une requête qui arrive avant la fin du chauffage attend le modèle (ou le
+charge elle-même si le chauffage est désactivé avec MODEL_WARMUP=0).
+
+MODEL_WARMUP :
+
+- 1 (défaut) : chauffage en arrière-plan ;
+- sync       : chargement pendant l'import, pour les serveurs pré-fork
+               (gunicorn --preload) : les workers forkés après le
+               chargement partagent les pages du modèle ;
+- 0          : pas de chauffage, chargement à la première requête.
+
+Après un fork, l'enfant repart avec des verrous neufs et recharge les
+modèles que le parent chargeait encore ; son chauffage est relancé à sa
+première requête.
+
+Le superviseur du reloader de Werkzeug (debug=True) ne sert aucune
+requête : il ne charge rien, seul le processus enfant chauffe les modèles.
+
+Profil des imports d'un service (python -X importtime, modèles non
+chauffés), trié par temps cumulé :
+
+    python lazy_models.py importtime IA --top 20
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import weakref
+
+from flask import jsonify
+
+logger = logging.getLogger(__name__)
+
+class LazyModel:
+    """Un modèle chargé une seule fois, au premier get() ou au chauffage."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = "pending"  # pending, loading, ready, error
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state == "ready":
+            return self._value
+        # Un seul chargement : les appelants concurrents attendent le verrou
+        with self._lock:
+            if self.state != "ready":
+                self._load()
+            return self._value
+
+    def _load(self):
+        self.state = "loading"
+        start = time.perf_counter()
+        try:
+            self._value = self.loader()
+        except Exception as e:
+            # Nouvel essai au prochain get()
+            self.state = "error"
+            self.error = str(e)
+            logger.error("❌ Chargement du modèle %s impossible: %s", self.name, e)
+            raise
+        self.load_seconds = time.perf_counter() - start
+        self.error = None
+        self.state = "ready"
+        logger.info("✅ Modèle %s chargé en %.1f s", self.name, self.load_seconds)
+
+    def _reset_after_fork(self):
+        # Le verrou a pu être copié verrouillé, et le thread qui chargeait
+        # n'existe pas dans l'enfant
+        self._lock = threading.Lock()
+        if self.state == "loading":
+            self.state = "pending"
+
+    def status(self):
+        status = {"state": self.state}
+        if self.load_seconds is not None:
+            status["load_seconds"] = round(self.load_seconds, 2)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+class LazyModels:
+    """Modèles d'un service, par nom."""
+
+    def __init__(self):
+        self._models = {}
+        self._thread = None
+        self._started = time.monotonic()
+        _instances.add(self)
+
+    def register(self, name, loader):
+        """loader : callable sans argument qui retourne le modèle chargé."""
+        self._models[name] = LazyModel(name, loader)
+
+    def get(self, name):
+        return self._models[name].get()
+
+    def warm_up(self):
+        """Charge tous les modèles dans un thread en arrière-plan (une seule fois)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.load_all, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def load_all(self):
+        """Charge tous les modèles dans le thread appelant ; les erreurs sont journalisées."""
+        for model in self._models.values():
+            try:
+                model.get()
+            except Exception:
+                pass  # déjà journalisé, visible dans /ready
+        if self.ready():
+            logger.info("🚀 Modèles prêts %.1f s après le démarrage", time.monotonic() - self._started)
+
+    def ready(self):
+        return all(m.state == "ready" for m in self._models.values())
+
+    def _reset_after_fork(self):
+        self._thread = None
+        for model in self._models.values():
+            model._reset_after_fork()
+
+    def status(self):
+        return {
+            "ready": self.ready(),
+            "uptime_seconds": round(time.monotonic() - self._started, 2),
+            "models": {name: m.status() for name, m in self._models.items()},
+        }
+
+_instances = weakref.WeakSet()
+
+def _after_fork_in_child():
+    for models in list(_instances):
+        models._reset_after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def debug_mode():
+    """Mode debug (et reloader) des services lancés en script : FLASK_DEBUG, actif par défaut."""
+    return os.environ.get("FLASK_DEBUG", "1") != "0"
+
+def serving_process(main, use_reloader):
+    """
+    Faux seulement dans le superviseur du reloader de Werkzeug : lancé comme
+    script avec le reloader, il relance le script dans un processus enfant
+    (WERKZEUG_RUN_MAIN=true) qui est le seul à servir les requêtes.
+    """
+    return not (main and use_reloader and os.environ.get("WERKZEUG_RUN_MAIN") != "true")
+
+def init_app(app, models, warm_up=True):
+    """Ajoute /health et /ready à l'application et lance le chauffage."""
+
+    @app.route("/health", methods=["GET"])
+    def health():
+        return jsonify({"status": "ok"}), 200
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        status = models.status()
+        return jsonify(status), 200 if status["ready"] else 503
+
+    mode = os.environ.get("MODEL_WARMUP", "1")
+    if warm_up and mode != "0":
+        if mode == "sync":
+            models.load_all()
+        else:
+            models.warm_up()
+
+        @app.before_request
+        def warm_up_after_fork():
+            # Sans effet sauf dans un worker forké (thread remis à zéro)
+            models.warm_up()
+    return models
+
+def import_profile(module, python=sys.executable):
+    """
+    Importe `module` dans un processus séparé avec -X importtime (sans
+    chauffage des modèles). Retourne la durée totale de l'import (s) et
+    [(module, cumul_us, propre_us)] pour chaque module importé.
+    """
+    env = dict(os.environ, MODEL_WARMUP="0")
+    # import_module : accepte aussi les noms de fichiers comme 3D ;
+    # -X importtime ne compte pas le module lui-même, chronométré à part
+    code = ("import importlib, time; start = time.perf_counter(); "
+            f"importlib.import_module({module!r}); print(time.perf_counter() - start)")
+    proc = subprocess.run([python, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else
+                           f"import {module} a échoué")
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        rows.append((fields[2].strip(), int(fields[1]), int(fields[0])))
+    return float(proc.stdout.strip().splitlines()[-1]), rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Outils de chargement des modèles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("importtime", help="Profil du temps d'import d'un service")
+    p.add_argument("module", help="Module du service, ex. IA, photo, 3D, server")
+    p.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    total, rows = import_profile(args.module)
+    print(f"{'module':<50}{'cumul ms':>10}{'propre ms':>11}")
+    for name, cumulative, own in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"{name:<50}{cumulative / 1000:>10.1f}{own / 1000:>11.1f}")
+    print(f"\nImport de {args.module} : {total:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,56 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import os
 import joblib
-import pandas as pd
 import numpy as np
-import pdfplumber
-import time
 import threading
 from werkzeug.utils import secure_filename
 import logging
 import json
-import torch
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 
+from cpus import available_cpus
+from danger_tiles import TileCache, valid_tile
+from danger_zones import CityEnsemble, PointStore, grid_around, label_points, raster_zones
+from extraction_cache import file_digest
+from gazetteer import get_gazetteer
+from jobs import JobManager
+from model_registry import atomic_dump
+from pdf_ingest import iter_city_data
+from report_parser import PARSER_VERSION, parse_city_data
+from ttl_cache import SQLiteCache, TTLCache, normalize_key
+from uploads import init_uploads
+
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 MODEL_CACHE = 'model_cache'
 ALLOWED_EXTENSIONS = {'pdf'}
+# Training grid around each city: +/- GRID_EXTENT degrees, GRID_STEPS points per half side
+GRID_EXTENT = float(os.environ.get('DANGER_GRID_EXTENT', 0.01))  # roughly 1km
+GRID_STEPS = int(os.environ.get('DANGER_GRID_STEPS', 20))
+# Incremental training keeps every ingested grid and refits only the touched cities
+INCREMENTAL_TRAINING = os.environ.get('DANGER_INCREMENTAL', '1') != '0'
+DANGER_MODEL_PATH = os.path.join(MODEL_CACHE, 'danger_zone_model.joblib')
+# Training jobs running at once; further jobs wait in the queue
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', 2))
+# PDF extraction processes per training job, so that all jobs together use
+# about one process per available core (not TRAINING_WORKERS x cores)
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS',
+                                        max(1, available_cpus() // TRAINING_WORKERS)))
+# Prediction around a city: 'raster' scores a (2 * steps + 1)^2 grid in one call
+# and merges dangerous cells into zones, 'point' only scores the city centre
+PREDICTION_MODE = os.environ.get('DANGER_PREDICTION_MODE', 'raster')
+PREDICTION_EXTENT = float(os.environ.get('DANGER_PREDICTION_EXTENT', GRID_EXTENT))
+PREDICTION_STEPS = int(os.environ.get('DANGER_PREDICTION_STEPS', 50))  # 101x101 grid
+DANGER_THRESHOLD = float(os.environ.get('DANGER_THRESHOLD', 0.5))
+# Danger tiles: model samples per tile side (256 = one per pixel) and the
+# zoom levels rendered around every city after training
+TILE_SAMPLES = int(os.environ.get('DANGER_TILE_SAMPLES', 256))
+TILE_PREWARM_ZOOMS = [int(z) for z in os.environ.get('DANGER_TILE_PREWARM_ZOOMS', '12,13,14,15,16').split(',') if z]
+# Tiles kept on disk for the current model; the oldest are evicted past it
+TILE_CACHE_MAX = int(os.environ.get('DANGER_TILE_CACHE_MAX', 50000))
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -36,13 +68,15 @@ app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['SECRET_KEY'] = 'secret!'  # Change this in production
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Uploads are streamed to disk next to their destination and hashed on the fly
+init_uploads(app, spool_dir=os.path.join(UPLOAD_FOLDER, '.spool'))
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Try to load existing models
 try:
     activity_model = joblib.load('activity_model.joblib')
     height_model = joblib.load('height_model.joblib')
-    danger_zone_model = joblib.load(os.path.join(MODEL_CACHE, 'danger_zone_model.joblib'))
+    danger_zone_model = joblib.load(DANGER_MODEL_PATH)
     logger.info("Models loaded successfully")
 except Exception as e:
     logger.warning(f"Could not load models: {e}")
@@ -50,64 +84,73 @@ except Exception as e:
     height_model = None
     danger_zone_model = None
 
-# Cache for city data to avoid repeated processing
-city_data_cache = {}
+# Offline gazetteer (GeoNames dump) for city lookups; built-in cities when unset
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', os.path.join('data', 'cities15000.txt'))
+GAZETTEER_MIN_POPULATION = int(os.environ.get('GAZETTEER_MIN_POPULATION', 0))
+# Cities mentioned in chat messages must be at least this big, so common
+# words that happen to be village names are not taken for cities
+CHAT_CITY_MIN_POPULATION = int(os.environ.get('CHAT_CITY_MIN_POPULATION', 50000))
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Rendered danger tiles, one pyramid per model version
+tile_cache = TileCache(os.path.join(MODEL_CACHE, 'tiles'), samples=TILE_SAMPLES,
+                       max_tiles=TILE_CACHE_MAX)
+
+# Labeled training points accumulated across incremental trainings
+point_store = PointStore(os.path.join(MODEL_CACHE, 'danger_points'))
+training_lock = threading.Lock()
 
-def extract_text_from_pdf(pdf_path):
-    text = ""
+# Cache for city data to avoid repeated processing: bounded LRU with TTL,
+# optionally shared by all workers through SQLite, and tied to the
+# version of the danger zone model the responses were computed with
+CITY_CACHE_MAX = int(os.environ.get('CITY_CACHE_MAX', 1024))
+CITY_CACHE_TTL = float(os.environ.get('CITY_CACHE_TTL', 3600))
+if os.environ.get('CITY_CACHE_BACKEND', 'memory') == 'sqlite':
+    city_data_cache = SQLiteCache(os.path.join(MODEL_CACHE, 'city_cache.sqlite3'),
+                                  max_entries=CITY_CACHE_MAX, ttl=CITY_CACHE_TTL)
+else:
+    city_data_cache = TTLCache(max_entries=CITY_CACHE_MAX, ttl=CITY_CACHE_TTL)
+
+def city_gazetteer():
+    """Gazetteer shared by the search and chat endpoints, loaded on first use."""
+    return get_gazetteer(GAZETTEER_PATH, GAZETTEER_MIN_POPULATION)
+
+def danger_model_version():
+    """Cheap version stamp of the persisted model (one stat call)."""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-    except Exception as e:
-        logger.error(f"Failed to extract text from PDF {pdf_path}: {e}")
-    return text
-
-def parse_city_data(text):
-    # Simple parsing logic - in a real app, this would be more sophisticated
-    data = {
-        'dangerous_areas': [],
-        'city_name': '',
-        'coordinates': {'lat': 0, 'lon': 0}
-    }
-    
-    lines = text.split('\n')
-    for line in lines:
-        if 'CITY:' in line:
-            data['city_name'] = line.split('CITY:')[1].strip()
-        elif 'COORDINATES:' in line:
-            coords = line.split('COORDINATES:')[1].strip().split(',')
-            if len(coords) >= 2:
-                try:
-                    data['coordinates']['lat'] = float(coords[0])
-                    data['coordinates']['lon'] = float(coords[1])
-                except ValueError:
-                    pass
-        elif 'DANGER ZONE:' in line:
-            danger_info = line.split('DANGER ZONE:')[1].strip()
-            # Format should be "name;latitude;longitude;radius;level;description"
-            parts = danger_info.split(';')
-            if len(parts) >= 6:
-                try:
-                    area = {
-                        'name': parts[0],
-                        'lat': float(parts[1]),
-                        'lon': float(parts[2]),
-                        'radius': float(parts[3]),
-                        'level': parts[4],
-                        'description': parts[5]
-                    }
-                    data['dangerous_areas'].append(area)
-                except (ValueError, IndexError):
-                    pass
-    
-    return data
+        st = os.stat(DANGER_MODEL_PATH)
+    except FileNotFoundError:
+        return 'none'
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+danger_model_stamp = danger_model_version()
+city_data_cache.set_version(danger_model_stamp)
+
+def refresh_danger_model():
+    """
+    Reload the model if the file changed (trained by a job or another
+    worker) and invalidate cached city responses computed with the old one.
+    """
+    global danger_zone_model, danger_model_stamp
+    
+    version = danger_model_version()
+    if version != danger_model_stamp:
+        danger_zone_model = load_danger_model()
+        danger_model_stamp = version
+        logger.info(f"Danger zone model reloaded (version {version})")
+    city_data_cache.set_version(version)
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def predict_danger_zones(city_name, lat, lon):
     # If we have a trained model, use it
+    if danger_zone_model is not None and PREDICTION_MODE == 'raster':
+        zones = raster_zones(danger_zone_model, lat, lon, extent=PREDICTION_EXTENT,
+                             steps=PREDICTION_STEPS, threshold=DANGER_THRESHOLD)
+        for zone in zones:
+            zone['description'] = f"Predicted danger zone in {city_name}"
+        return zones
+    
     if danger_zone_model is not None:
         # This is a simplified example - in a real application,
         # you would need actual features of the area
@@ -133,112 +176,218 @@ def predict_danger_zones(city_name, lat, lon):
         'description': f"Simulated danger zone in {city_name}"
     } for _ in range(3)]
 
-def train_model_on_files(files):
+def load_danger_model():
+    """Load the persisted danger-zone model, or None if there is none yet."""
+    try:
+        return joblib.load(DANGER_MODEL_PATH)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not load danger zone model: {e}")
+        return None
+
+def city_key(city_data, digest):
+    """Sub-model key: normalised city name, or the file digest when unnamed."""
+    return city_data['city_name'].strip().lower() or digest[:12]
+
+def fit_danger_model(X, y):
+    """Fit one RandomForest on labeled grid points and log its hold-out accuracy."""
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X_train, y_train)
+    accuracy = model.score(X_test, y_test)
+    logger.info(f"Model trained with accuracy: {accuracy}")
+    return model
+
+def train_model_on_files(files, grid_steps=None, progress=None, workers=None, incremental=None,
+                         fit_progress=None):
+    """
+    progress(pages_done, pages_total, file_path) is called per extracted page
+    and fit_progress(models_done, models_total, name) around each model fit.
+    """
+    if grid_steps is None:
+        grid_steps = GRID_STEPS
+    if incremental is None:
+        incremental = INCREMENTAL_TRAINING
+    
+    if incremental:
+        return train_model_incremental(files, grid_steps, progress, workers, fit_progress)
+    return train_model_full(files, grid_steps, progress, workers, fit_progress)
+
+def train_model_full(files, grid_steps, progress=None, workers=None, fit_progress=None):
+    """Refit a single forest from scratch on the given files only."""
     global danger_zone_model
     
-    features = []
-    labels = []
-    
-    for file_path in files:
-        text = extract_text_from_pdf(file_path)
-        city_data = parse_city_data(text)
-        
+    # Extract PDFs in parallel; keep the per-file grids in input order so
+    # the training set does not depend on which file finished first
+    grids = {}
+    for file_path, city_data in iter_city_data(files, parse_city_data,
+                                               max_workers=workers, progress=progress,
+                                               parser_version=PARSER_VERSION):
+        if city_data is None:
+            continue
         # Extract base coordinates
         base_lat = city_data['coordinates']['lat']
         base_lon = city_data['coordinates']['lon']
         
-        # Create a grid of points around the city center
-        grid_size = 0.01  # roughly 1km
-        grid_points = 20
-        
-        for i in range(-grid_points, grid_points + 1):
-            for j in range(-grid_points, grid_points + 1):
-                point_lat = base_lat + i * grid_size / grid_points
-                point_lon = base_lon + j * grid_size / grid_points
-                
-                # Determine if point is in a danger zone
-                in_danger_zone = False
-                for area in city_data['dangerous_areas']:
-                    dlat = point_lat - area['lat']
-                    dlon = point_lon - area['lon']
-                    distance_squared = dlat**2 + dlon**2
-                    radius_degrees = area['radius'] / 111000  # approximate conversion from meters to degrees
-                    if distance_squared <= radius_degrees**2:
-                        in_danger_zone = True
-                        break
-                
-                # Add feature and label
-                features.append([point_lat, point_lon])
-                labels.append(1 if in_danger_zone else 0)
+        # Create a grid of points around the city center and label it
+        # against a spatial index of the danger zones
+        points = grid_around(base_lat, base_lon, extent=GRID_EXTENT, steps=grid_steps)
+        grids[file_path] = (points, label_points(points, city_data['dangerous_areas']))
+    
+    ordered = [grids[path] for path in dict.fromkeys(files) if path in grids]
+    features = [points for points, _ in ordered]
+    labels = [point_labels for _, point_labels in ordered]
     
     if not features:
         logger.warning("No features extracted for training")
         return False
     
-    # Convert to numpy arrays
-    X = np.array(features)
-    y = np.array(labels)
-    
-    # Train test split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Stack the per-file grids and train a model
+    if fit_progress is not None:
+        fit_progress(0, 1, 'all')
+    model = fit_danger_model(np.vstack(features), np.concatenate(labels))
+    if fit_progress is not None:
+        fit_progress(1, 1, 'all')
     
-    # Train a model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Save the model
-    joblib.dump(model, os.path.join(MODEL_CACHE, 'danger_zone_model.joblib'))
-    
-    # Update the global model
+    # Save the model, then swap the global reference
+    atomic_dump(model, DANGER_MODEL_PATH)
     danger_zone_model = model
     
-    accuracy = model.score(X_test, y_test)
-    logger.info(f"Model trained with accuracy: {accuracy}")
-    
     return True
 
-def simulate_training_progress(file_paths):
-    """Simulates training progress updates via WebSocket."""
-    try:
-        total_steps = 10
-        for i in range(total_steps + 1):
-            progress = int(i * 100 / total_steps)
-            socketio.emit('training_progress', {'progress': progress})
-            time.sleep(1)  # Simulate processing time
+def train_model_incremental(files, grid_steps, progress=None, workers=None, fit_progress=None):
+    """
+    Ingest only files not seen before, append their labeled grids to the
+    point store and refit the sub-models of the cities they touch.
+    """
+    global danger_zone_model
+    
+    with training_lock, point_store.locked():
+        digests = {}
+        for file_path in dict.fromkeys(files):
+            try:
+                digest = file_digest(file_path)
+            except OSError as e:
+                logger.error(f"Failed to read training file {file_path}: {e}")
+                continue
+            if point_store.has(digest):
+                logger.info(f"Skipping already ingested file {file_path}")
+                continue
+            digests[file_path] = digest
+        
+        touched = []
+        for file_path, city_data in iter_city_data(list(digests), parse_city_data,
+                                                   max_workers=workers, progress=progress,
+                                                   parser_version=PARSER_VERSION):
+            if city_data is None:
+                # Digest not recorded: uploading the file again retries it
+                logger.warning(f"Not ingesting {file_path}: text extraction failed")
+                continue
+            base_lat = city_data['coordinates']['lat']
+            base_lon = city_data['coordinates']['lon']
+            points = grid_around(base_lat, base_lon, extent=GRID_EXTENT, steps=grid_steps)
+            city = city_key(city_data, digests[file_path])
+            point_store.append(digests[file_path], city,
+                               points, label_points(points, city_data['dangerous_areas']))
+            touched.append(city)
+        
+        # Start from the model on disk: another worker may have trained since
+        # this process last loaded it
+        model = load_danger_model()
+        if not isinstance(model, CityEnsemble):
+            # Legacy single-forest model: rebuild every city from the store
+            model = CityEnsemble()
+            touched = point_store.cities()
         
-        # Actual training (could be long, so we do it after showing UI progress)
-        success = train_model_on_files(file_paths)
+        if not touched:
+            if not point_store.cities():
+                logger.warning("No features extracted for training")
+                return False
+            logger.info("No new training data, model unchanged")
+            return True
         
-        if success:
-            # Send a completed message
-            socketio.emit('training_progress', {'progress': 100, 'message': 'Training completed successfully!'})
-            
-            # Detect new danger zones and broadcast to clients
-            # For demo, we'll just generate random zones
-            zones = []
-            for _ in range(3):
-                zones.append({
-                    'lat': 48.8566 + np.random.random() * 0.02 - 0.01,  # Around Paris
-                    'lon': 2.3522 + np.random.random() * 0.02 - 0.01,
-                    'radius': np.random.randint(200, 500),
-                    'level': np.random.choice(['Low', 'Medium', 'High']),
-                    'description': 'Newly detected danger zone'
-                })
-            socketio.emit('danger_zones_update', {'zones': zones})
-        else:
-            socketio.emit('training_progress', {
-                'progress': 100, 
-                'error': True,
-                'message': 'Training failed. Check server logs.'
-            })
-            
+        pad = GRID_EXTENT / grid_steps / 2
+        touched = list(dict.fromkeys(touched))
+        for done, city in enumerate(touched):
+            if fit_progress is not None:
+                fit_progress(done, len(touched), city)
+            X, y = point_store.city_arrays(city)
+            logger.info(f"Training danger zone sub-model for {city} on {len(y)} points")
+            bbox = [X[:, 0].min() - pad, X[:, 1].min() - pad,
+                    X[:, 0].max() + pad, X[:, 1].max() + pad]
+            model = model.with_submodel(city, fit_danger_model(X, y), bbox)
+        
+        if fit_progress is not None:
+            fit_progress(len(touched), len(touched), None)
+        
+        # Readers keep using the old ensemble until this single assignment
+        atomic_dump(model, DANGER_MODEL_PATH)
+        danger_zone_model = model
+    
+    return True
+
+def run_training_job(report, file_paths):
+    """
+    Training job, run in a worker process of training_jobs. Progress comes
+    from the real stages: 0-70% page extraction, 70-95% model fits.
+    """
+    def extraction_progress(pages_done, pages_total, file_path):
+        report('extract', 70 * pages_done / max(pages_total, 1),
+               f"Extracted page {pages_done}/{pages_total} ({os.path.basename(file_path)})")
+    
+    def fit_progress(models_done, models_total, name):
+        message = f"Training {name}" if name else "Saving model"
+        report('fit', 70 + 25 * models_done / max(models_total, 1), message)
+    
+    if not train_model_on_files(file_paths, progress=extraction_progress, workers=EXTRACTION_WORKERS,
+                                fit_progress=fit_progress):
+        raise RuntimeError('Training failed. Check server logs.')
+    return True
+
+def emit_job_event(job):
+    """Forward job table updates to WebSocket clients."""
+    payload = {'job_id': job['id'], 'status': job['status'], 'progress': job['progress']}
+    if job['message']:
+        payload['message'] = job['message']
+    if job['status'] == 'succeeded':
+        payload['message'] = 'Training completed successfully!'
+    elif job['status'] == 'failed':
+        payload.update(error=True, message=f"Error: {job['error']}")
+    elif job['status'] == 'cancelled':
+        payload.update(error=True, message='Training cancelled.')
+    socketio.emit('training_progress', payload)
+
+def on_training_done(job):
+    """Swap in the freshly trained model once a training job finishes."""
+    if job['status'] != 'succeeded':
+        return
+    refresh_danger_model()
+    
+    # Broadcast the zones predicted around every trained city
+    model = danger_zone_model
+    if not isinstance(model, CityEnsemble) or PREDICTION_MODE != 'raster':
+        return
+    zones = []
+    for city, (lat, lon) in model.city_centers().items():
+        zones.extend(predict_danger_zones(city, lat, lon))
+    socketio.emit('danger_zones_update', {'zones': zones})
+    
+    # Render the tiles around the cities in the background so the first
+    # map views after training are served from disk
+    threading.Thread(target=prewarm_tiles, args=(model, danger_model_stamp),
+                     name='tiles-prewarm', daemon=True).start()
+
+def prewarm_tiles(model, version):
+    try:
+        tile_cache.prune(version)
+        tile_cache.prewarm(model, version, model.city_bboxes().values(), TILE_PREWARM_ZOOMS)
     except Exception as e:
-        logger.error(f"Error in training thread: {e}")
-        socketio.emit('training_progress', {
-            'progress': 100, 
-            'error': True,
-            'message': f'Error: {str(e)}'
-        })
+        logger.error(f"Tile pre-warm failed: {e}")
+
+# Bounded pool for training: extra uploads queue instead of competing for cores
+training_jobs = JobManager(max_workers=TRAINING_WORKERS, on_event=emit_job_event,
+                           on_done=on_training_done)
 
 @app.route('/api/search_city', methods=['POST'])
 def search_city():
@@ -248,42 +397,35 @@ def search_city():
     if not city_name:
         return jsonify({'error': 'City name is required'}), 400
     
-    # Check if we have cached data for this city
-    if city_name in city_data_cache:
-        return jsonify(city_data_cache[city_name])
-    
-    # Simplified city coordinates lookup - in a real app, use a geocoding service
-    city_coords = {
-        'paris': {'lat': 48.8566, 'lon': 2.3522},
-        'london': {'lat': 51.5074, 'lon': -0.1278},
-        'new york': {'lat': 40.7128, 'lon': -74.0060},
-        'tokyo': {'lat': 35.6762, 'lon': 139.6503},
-        'berlin': {'lat': 52.5200, 'lon': 13.4050},
-        'moscow': {'lat': 55.7558, 'lon': 37.6173},
-        'beijing': {'lat': 39.9042, 'lon': 116.4074},
-    }
-    
-    city_name_lower = city_name.lower()
-    if city_name_lower in city_coords:
-        lat = city_coords[city_name_lower]['lat']
-        lon = city_coords[city_name_lower]['lon']
-    else:
-        # Default to a random location if city not found
-        lat = np.random.uniform(35, 55)
-        lon = np.random.uniform(-10, 20)
+    # Check if we have cached data for this city (and the current model)
+    refresh_danger_model()
+    cache_key = normalize_key(city_name)
+    cached = city_data_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+    
+    place = city_gazetteer().lookup(city_name)
+    if place is None:
+        suggestions = city_gazetteer().prefix(city_name, limit=5)
+        return jsonify({'error': 'City not found',
+                        'suggestions': [p['name'] for p in suggestions]}), 404
+    lat = place['lat']
+    lon = place['lon']
     
     # Get danger zones for this city
     danger_zones = predict_danger_zones(city_name, lat, lon)
     
     response_data = {
         'city': city_name,
+        'name': place['name'],
+        'country': place['country'],
         'lat': lat,
         'lon': lon,
         'danger_zones': danger_zones
     }
     
     # Cache the response
-    city_data_cache[city_name] = response_data
+    city_data_cache.set(cache_key, response_data)
     
     return jsonify(response_data)
 
@@ -296,13 +438,16 @@ def upload_training_data():
     if not files or files[0].filename == '':
         return jsonify({'success': False, 'message': 'No files selected'}), 400
     
+    # Files are stored by content hash: re-uploading the same PDF (under any
+    # name) reuses the stored copy instead of writing it again
     saved_files = []
     for file in files:
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            saved_files.append(file_path)
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{file.stream.sha256}.pdf")
+            if not file.stream.persist(file_path):
+                logger.info(f"Upload {secure_filename(file.filename)} already stored as {file_path}")
+            if file_path not in saved_files:
+                saved_files.append(file_path)
     
     if not saved_files:
         return jsonify({
@@ -316,6 +461,10 @@ def upload_training_data():
         'files': saved_files
     })
 
+@app.errorhandler(413)
+def upload_too_large(error):
+    return jsonify({'success': False, 'message': error.description}), 413
+
 @app.route('/api/train_model', methods=['POST'])
 def train_model_endpoint():
     data = request.json
@@ -324,14 +473,51 @@ def train_model_endpoint():
     if not files:
         return jsonify({'success': False, 'message': 'No files provided for training'}), 400
     
-    # Start training in a separate thread to not block the main thread
-    threading.Thread(target=simulate_training_progress, args=(files,)).start()
+    # Run training on the job pool to not block the request
+    job_id = training_jobs.submit(run_training_job, files, name='train_model')
     
     return jsonify({
         'success': True, 
-        'message': 'Training started. You will receive progress updates.'
+        'message': 'Training started. You will receive progress updates.',
+        'job_id': job_id
     })
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def danger_tile(z, x, y):
+    if not valid_tile(z, x, y):
+        return jsonify({'error': 'Tile out of range'}), 404
+    
+    refresh_danger_model()
+    model, version = danger_zone_model, danger_model_stamp
+    data = tile_cache.get(model, version, z, x, y)
+    
+    response = Response(data, mimetype='image/png')
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    response.set_etag(f"{version}-{z}-{x}-{y}")
+    return response.make_conditional(request)
+
+@app.route('/api/cities', methods=['GET'])
+def suggest_cities():
+    """Autocomplete: cities whose name starts with ?q=, most populated first."""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    places = city_gazetteer().prefix(query, limit=limit)
+    return jsonify({'cities': places})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
@@ -340,17 +526,10 @@ def chat():
     if not user_message:
         return jsonify({'response': 'Please provide a message'}), 400
     
-    # Simple NLP to detect city names - in a real app, use a more sophisticated approach
-    common_cities = [
-        'paris', 'london', 'new york', 'tokyo', 'berlin', 'moscow', 'beijing',
-        'madrid', 'rome', 'sydney', 'cairo', 'mumbai', 'rio', 'delhi', 'istanbul'
-    ]
-    
-    city_found = None
-    for city in common_cities:
-        if city.lower() in user_message.lower():
-            city_found = city
-            break
+    # Detect a city name in the message with the gazetteer
+    place = city_gazetteer().find_in_text(
+        user_message, min_population=CHAT_CITY_MIN_POPULATION)
+    city_found = place['name'] if place else None
     
     if "danger" in user_message.lower() and "zone" in user_message.lower():
         response = "Je peux vous aider à identifier les zones dangereuses dans une ville. Veuillez préciser la ville qui vous intéresse."
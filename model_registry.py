@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registre des modèles persistés.
+
+Charge les artefacts joblib de `models/` au démarrage, en mémoire partagée
+(`mmap_mode`) pour que les workers forkés se partagent les mêmes pages, et
+versionne chaque modèle par le hash de son contenu. On n'entraîne qu'en
+dernier recours, quand l'artefact est absent (ou illisible) ; le modèle
+entraîné est alors écrit dans le cache (`model_cache/models/`), jamais dans
+`models/` qui est versionné, et rechargé (en mmap) aux démarrages suivants
+au lieu d'être réentraîné par chaque worker.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+from collections import namedtuple
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+TRAINED_MODEL_DIR = os.environ.get("TRAINED_MODEL_DIR", os.path.join("model_cache", "models"))
+
+ModelEntry = namedtuple("ModelEntry", ["name", "model", "version", "path", "source"])
+
+def content_hash(path, chunk_size=1 << 20):
+    """Version d'un artefact : 12 premiers caractères du SHA-256 du fichier."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+def atomic_dump(obj, path):
+    """joblib.dump dans un fichier temporaire puis os.replace (pas de lecture partielle)."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class ModelRegistry:
+    """
+    Associe un nom à un artefact `<model_dir>/<name>.joblib` et, en option,
+    à une fonction d'entraînement de secours dont le résultat est persisté
+    dans `<trained_dir>/<name>.joblib`.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, mmap_mode="r", trained_dir=TRAINED_MODEL_DIR):
+        self.model_dir = model_dir
+        self.trained_dir = trained_dir
+        self.mmap_mode = mmap_mode
+        self._trainers = {}
+        self._entries = {}
+
+    def register(self, name, trainer=None):
+        """trainer : callable sans argument qui retourne un estimateur entraîné."""
+        self._trainers[name] = trainer
+
+    def path(self, name):
+        """Artefact livré s'il existe, sinon celui d'un entraînement de secours."""
+        path = self._artifact_path(name)
+        if os.path.exists(path):
+            return path
+        return self._trained_path(name)
+
+    def _artifact_path(self, name):
+        return os.path.join(self.model_dir, f"{name}.joblib")
+
+    def _trained_path(self, name):
+        return os.path.join(self.trained_dir, f"{name}.joblib")
+
+    def load(self, name):
+        path = self._artifact_path(name)
+        if os.path.exists(path):
+            entry = self._load_file(name, path, "artifact")
+            if entry is not None:
+                return entry
+            # Artefact présent mais illisible (ex. version de scikit-learn) :
+            # on ne l'écrase pas, on passe au modèle de secours persisté.
+
+        trainer = self._trainers.get(name)
+        trained = self._trained_path(name)
+        if os.path.exists(trained):
+            entry = self._load_file(name, trained, "trained")
+            if entry is not None:
+                return entry
+
+        if trainer is None:
+            logger.warning("⚠️ Modèle %s indisponible et aucun entraînement de secours", name)
+            return None
+
+        os.makedirs(self.trained_dir, exist_ok=True)
+        # Un seul worker entraîne ; les autres attendent puis rechargent son résultat
+        with open(trained + ".lock", "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(trained):
+                    entry = self._load_file(name, trained, "trained")
+                    if entry is not None:
+                        return entry
+                logger.info("🛠️ Entraînement de secours du modèle %s vers %s", name, trained)
+                atomic_dump(trainer(), trained)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        # Rechargé depuis le disque pour profiter du mmap comme les autres
+        return self._load_file(name, trained, "trained")
+
+    def _load_file(self, name, path, source):
+        """Charge un artefact en mmap et l'enregistre ; None s'il est illisible."""
+        try:
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+        except Exception as e:
+            logger.warning("⚠️ Artefact %s illisible: %s", path, e)
+            return None
+        entry = ModelEntry(name, model, content_hash(path), path, source)
+        self._entries[name] = entry
+        logger.info("📦 Modèle %s chargé depuis %s (version %s)", name, path, entry.version)
+        return entry
+
+    def load_all(self):
+        for name in self._trainers:
+            self.load(name)
+        return self
+
+    def get(self, name):
+        entry = self._entries.get(name)
+        return entry.model if entry else None
+
+    def version(self, name):
+        entry = self._entries.get(name)
+        return entry.version if entry else None
+
+    def versions(self):
+        return {name: {"version": e.version, "source": e.source}
+                for name, e in self._entries.items()}
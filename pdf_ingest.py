@@ -0,0 +1,223 @@
+"""
+Parallel PDF ingestion shared by train.py and mapIA.py.
+
+pdfplumber is CPU-bound and single-threaded, so extraction is spread over a
+process pool: every file is split into page ranges, workers extract the
+ranges independently and report each page as it is done. As soon as all
+pages of a file are back, its text is parsed in the parent process and the
+resulting city_data dict is yielded, without waiting for the other files.
+
+Files already seen (same bytes) are served from the content-addressed
+extraction cache and never reach the pool.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pdfplumber
+
+from extraction_cache import ExtractionCache, file_digest
+
+logger = logging.getLogger('MapIA-Ingest')
+
+# Pages handed to a worker per task: small enough to balance large files
+# over the pool, large enough that re-opening the PDF stays cheap.
+PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 16))
+
+_progress_queue = None
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+def _page_count(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def _extract_pages(pdf_path, start, stop):
+    """Extract pages [start, stop) of a PDF; pages without text yield ''."""
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+            if _progress_queue is not None:
+                _progress_queue.put(pdf_path)
+    return texts
+
+def iter_city_data(file_paths, parse, max_workers=None, pages_per_task=PAGES_PER_TASK,
+                   progress=None, parser_version=None, cache=None):
+    """
+    Extract and parse PDFs in parallel, yielding (file_path, city_data) in
+    completion order. city_data is None when a file could not be read or
+    extracted: nothing is cached for it, so a later call retries it.
+
+    parse: callable(text) -> city_data, run in the parent process.
+    progress: optional callable(pages_done, pages_total, file_path), called
+    once per extracted page.
+    max_workers: pool size (defaults to the CPU count); 0 extracts serially
+    in-process.
+    parser_version: when given, parsed results are cached under that
+    version as well as the raw text; bump it whenever `parse` changes.
+    cache: ExtractionCache to use (a default one under model_cache/ is
+    created when None; pass False to disable caching).
+    """
+    file_paths = list(dict.fromkeys(file_paths))
+    if not file_paths:
+        return
+    if cache is None:
+        cache = ExtractionCache()
+
+    digests = {}
+    to_extract = []
+    for path in file_paths:
+        digest = None
+        if cache:
+            try:
+                digest = file_digest(path)
+            except OSError as e:
+                logger.error(f"Error extracting text from {path}: {e}")
+                yield path, None
+                continue
+            if parser_version is not None:
+                parsed = cache.get_parsed(digest, parser_version)
+                if parsed is not None:
+                    yield path, parsed
+                    continue
+            text = cache.get_text(digest)
+            if text is not None:
+                yield path, _parse_and_store(cache, digest, parser_version, parse, text)
+                continue
+        digests[path] = digest
+        to_extract.append(path)
+
+    if not to_extract:
+        return
+    logger.info(f"Extracting {len(to_extract)} of {len(file_paths)} file(s)")
+
+    if max_workers == 0:
+        extracted = _extract_serial(to_extract, progress)
+    else:
+        extracted = _extract_parallel(to_extract, max_workers, pages_per_task, progress)
+
+    for path, text, ok in extracted:
+        digest = digests[path]
+        if not ok:
+            yield path, None
+        elif cache:
+            cache.put_text(digest, text)
+            yield path, _parse_and_store(cache, digest, parser_version, parse, text)
+        else:
+            yield path, parse(text)
+
+def _parse_and_store(cache, digest, parser_version, parse, text):
+    parsed = parse(text)
+    if parser_version is not None:
+        cache.put_parsed(digest, parser_version, parsed)
+    return parsed
+
+def _extract_parallel(file_paths, max_workers, pages_per_task, progress):
+    """Yield (file_path, text, ok) as files complete; ok is False on extraction errors."""
+    ctx = multiprocessing.get_context()
+    progress_queue = ctx.Queue()
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                               initializer=_init_worker, initargs=(progress_queue,))
+    try:
+        # Page counts first (per-file parallelism), then page ranges
+        count_futures = {pool.submit(_page_count, path): path for path in file_paths}
+        page_counts = {}
+        failed = set()
+        for future in list(count_futures):
+            path = count_futures[future]
+            try:
+                page_counts[path] = future.result()
+            except Exception as e:
+                logger.error(f"Error extracting text from {path}: {e}")
+                page_counts[path] = 0
+                failed.add(path)
+
+        total_pages = sum(page_counts.values())
+        pages_done = 0
+        chunks = {}
+        remaining = {}
+        pending = {}
+        for path in file_paths:
+            count = page_counts[path]
+            remaining[path] = 0
+            chunks[path] = {}
+            for start in range(0, count, pages_per_task):
+                stop = min(start + pages_per_task, count)
+                pending[pool.submit(_extract_pages, path, start, stop)] = (path, start)
+                remaining[path] += 1
+
+        # Files that failed to open or have no pages complete immediately
+        for path in file_paths:
+            if remaining[path] == 0:
+                yield path, "", path not in failed
+
+        while pending:
+            done, _ = wait(list(pending), timeout=0.2, return_when=FIRST_COMPLETED)
+            pages_done = _drain_progress(progress_queue, progress, pages_done, total_pages)
+            for future in done:
+                path, start = pending.pop(future)
+                try:
+                    chunks[path][start] = future.result()
+                except Exception as e:
+                    logger.error(f"Error extracting pages {start}+ of {path}: {e}")
+                    chunks[path][start] = []
+                    failed.add(path)
+                remaining[path] -= 1
+                if remaining[path] == 0:
+                    pages = [text for key in sorted(chunks[path]) for text in chunks[path][key]]
+                    del chunks[path]
+                    yield path, "\n".join(pages), path not in failed
+
+        _drain_progress(progress_queue, progress, pages_done, total_pages, timeout=1.0)
+    finally:
+        # Also reached when the consumer stops iterating early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _drain_progress(progress_queue, progress, pages_done, total_pages, timeout=None):
+    """Report queued page events; with a timeout, wait for late ones up to total_pages."""
+    while True:
+        try:
+            if timeout is not None and pages_done < total_pages:
+                path = progress_queue.get(timeout=timeout)
+            else:
+                path = progress_queue.get_nowait()
+        except queue.Empty:
+            return pages_done
+        pages_done += 1
+        if progress is not None:
+            progress(pages_done, total_pages, path)
+
+def _extract_serial(file_paths, progress):
+    """In-process counterpart of _extract_parallel."""
+    page_counts = {}
+    for path in file_paths:
+        try:
+            page_counts[path] = _page_count(path)
+        except Exception as e:
+            logger.error(f"Error extracting text from {path}: {e}")
+            page_counts[path] = None
+    total_pages = sum(count or 0 for count in page_counts.values())
+    pages_done = 0
+    for path in file_paths:
+        if page_counts[path] is None:
+            yield path, "", False
+            continue
+        texts = []
+        try:
+            with pdfplumber.open(path) as pdf:
+                for page in pdf.pages:
+                    texts.append(page.extract_text() or "")
+                    pages_done += 1
+                    if progress is not None:
+                        progress(pages_done, total_pages, path)
+        except Exception as e:
+            logger.error(f"Error extracting text from {path}: {e}")
+            yield path, "\n".join(texts), False
+            continue
+        yield path, "\n".join(texts), True
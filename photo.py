@@ -1,62 +1,131 @@
 # -*- coding: utf-8 -*-
 import io
+import os
 import base64
+from collections import namedtuple
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from PIL import Image
-import torch
-import torchvision.transforms as transforms
-from torchvision import models
+
+from batching import MicroBatcher
+from cpus import available_cpus
+from lazy_models import LazyModels, debug_mode, init_app, serving_process
 
 # Initialiser Flask
 app = Flask(__name__)
 CORS(app)
+DEBUG = debug_mode()
+
+# Images regroupées par passage du modèle (les gains du lot plafonnent
+# vers 8-16 images sur CPU) et attente maximale pour remplir un lot
+PHOTO_BATCH_MAX = int(os.environ.get("PHOTO_BATCH_MAX", 16))
+PHOTO_BATCH_WAIT_MS = float(os.environ.get("PHOTO_BATCH_WAIT_MS", 5))
+# Nombre maximal d'images par appel à /analyze_batch
+ANALYZE_BATCH_LIMIT = int(os.environ.get("ANALYZE_BATCH_LIMIT", 64))
+
+Classifier = namedtuple("Classifier", ["model", "transform"])
+
+def load_classifier():
+    """ResNet18 et sa transformation ; torch et torchvision ne sont importés qu'ici."""
+    import torch
+    import torchvision.transforms as transforms
+    from torchvision import models
+
+    # Threads CPU : intra-op = cœurs attribués au processus (masque d'affinité,
+    # pas les cœurs de l'hôte ; réglable), inter-op = 1, les requêtes
+    # concurrentes étant déjà regroupées en un seul appel au modèle
+    torch.set_num_threads(int(os.environ.get("TORCH_NUM_THREADS", available_cpus())))
+    try:
+        torch.set_num_interop_threads(int(os.environ.get("TORCH_NUM_INTEROP_THREADS", 1)))
+    except RuntimeError:
+        pass  # déjà fixé par un autre module
 
-# Charger le modèle Résolut pour reconnaître les plantes
-model = models.resnet18(pretrained=True)  # Exemple avec ResNet18
-model.eval()
+    # Charger le modèle Résolut pour reconnaître les plantes
+    model = models.resnet18(pretrained=True)  # Exemple avec ResNet18
+    model.eval()
+    # Convolutions plus rapides sur CPU avec des tenseurs NHWC
+    model = model.to(memory_format=torch.channels_last)
 
-# Transformation nécessaire pour l'image
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std=[0.229, 0.224, 0.225])
-])
+    # Transformation nécessaire pour l'image
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                             std=[0.229, 0.224, 0.225])
+    ])
+    return Classifier(model, transform)
+
+# Chargé en arrière-plan au démarrage (voir lazy_models.py)
+LAZY_MODELS = LazyModels()
+LAZY_MODELS.register("resnet18", load_classifier)
+init_app(app, LAZY_MODELS, warm_up=serving_process(__name__ == "__main__", DEBUG))
 
 def process_image(image_data):
-    """Transforme l'image base64 en un tensore lisible par le modèle."""
+    """Transforme l'image base64 en un tensore (3, 224, 224) lisible par le modèle."""
     image = Image.open(io.BytesIO(image_data)).convert("RGB")
-    image = transform(image).unsqueeze(0)  # Ajouter une dimension
-    return image
+    return LAZY_MODELS.get("resnet18").transform(image)
+
+def classify_batch(image_tensors):
+    """Un seul passage du modèle pour N images ; indice de la classe prédite par image."""
+    import torch
+
+    model = LAZY_MODELS.get("resnet18").model
+    batch = torch.stack(image_tensors).contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        output = model(batch)
+    return output.argmax(dim=1).tolist()
+
+# Les images concurrentes (et celles d'un même /analyze_batch) sont
+# regroupées en un lot NCHW
+PHOTO_BATCHER = MicroBatcher(
+    classify_batch,
+    max_batch_size=PHOTO_BATCH_MAX,
+    max_wait_ms=PHOTO_BATCH_WAIT_MS,
+    name="photo-batcher",
+)
+
+def describe_prediction(predicted_idx):
+    # Exemple de mappage de prédictions
+    # Ajoutez votre propre mappage si vous avez des catégories spécifiques aux plantes
+    classes = ["Classe 0", "Classe 1", "Classe Plante Medicinale"]
+    plant_name = classes[predicted_idx]
+    details = f"Identifié comme {plant_name}."
+
+    return {
+        "isPlant": True,
+        "plantName": plant_name,
+        "details": details
+    }
+
+def analyze_images(images_data):
+    """
+    Analyse plusieurs images : prétraitement dans le thread appelant, puis
+    une prédiction par image via le batcher. Une image illisible donne
+    {"isPlant": False} sans faire échouer les autres.
+    """
+    tensors = []
+    for image_data in images_data:
+        try:
+            tensors.append(process_image(image_data))
+        except Exception as e:
+            print(f"Erreur lors de l'analyse de l'image : {e}")
+            tensors.append(None)
+    # Soumises ensemble : les images d'un même appel partagent un lot
+    futures = [PHOTO_BATCHER.submit_async(t) if t is not None else None for t in tensors]
+
+    results = []
+    for future in futures:
+        result = {"isPlant": False}
+        if future is not None:
+            try:
+                result = describe_prediction(future.result())
+            except Exception as e:
+                print(f"Erreur lors de l'analyse de l'image : {e}")
+        results.append(result)
+    return results
 
 def analyze_image(image_data):
-    try:
-        # Charger et transformer l'image
-        image_tensor = process_image(image_data)
-
-        # Modèle PyTorch pour prédiction
-        with torch.no_grad():
-            output = model(image_tensor)
-        
-        # Obtenir les prédictions
-        _, predicted_idx = torch.max(output, 1)
-        predicted_idx = predicted_idx.item()
-
-        # Exemple de mappage de prédictions
-        # Ajoutez votre propre mappage si vous avez des catégories spécifiques aux plantes
-        classes = ["Classe 0", "Classe 1", "Classe Plante Medicinale"]
-        plant_name = classes[predicted_idx]
-        details = f"Identifié comme {plant_name}."
-
-        return {
-            "isPlant": True, 
-            "plantName": plant_name, 
-            "details": details
-        }
-    except Exception as e:
-        print(f"Erreur lors de l'analyse de l'image : {e}")
-        return {"isPlant": False}
+    return analyze_images([image_data])[0]
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -69,6 +138,30 @@ def analyze():
         print(f"Erreur serveur : {error}")
         return jsonify({"error": "Erreur serveur"}), 500
 
-if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5005)
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """
+    Reçoit JSON { imagesBase64: [..] } et retourne { count, results } avec,
+    dans l'ordre, le même résultat que /analyze pour chaque image.
+    """
+    images = (request.get_json(silent=True) or {}).get("imagesBase64")
+    if not isinstance(images, list) or not images:
+        return jsonify({"error": "imagesBase64 doit être une liste non vide"}), 400
+    if len(images) > ANALYZE_BATCH_LIMIT:
+        return jsonify({"error": f"Au plus {ANALYZE_BATCH_LIMIT} images par appel"}), 400
 
+    try:
+        images_data = []
+        for data in images:
+            try:
+                images_data.append(base64.b64decode(data))
+            except Exception:
+                images_data.append(b"")  # illisible : {"isPlant": False}
+        results = analyze_images(images_data)
+        return jsonify({"count": len(results), "results": results})
+    except Exception as error:
+        print(f"Erreur serveur : {error}")
+        return jsonify({"error": "Erreur serveur"}), 500
+
+if __name__ == "__main__":
+    app.run(debug=DEBUG, host="0.0.0.0", port=5005, threaded=True)
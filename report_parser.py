@@ -0,0 +1,112 @@
+"""
+Parser for the city danger reports used to train MapIA.
+
+Reports are plain text (extracted from PDFs) containing, anywhere in a line:
+
+    CITY: <name>
+    COORDINATES: <lat>, <lon>
+    DANGER ZONE: <name>;<lat>;<lon>;<radius>;<level>;<description>
+
+Each marker has its own compiled regex with a literal prefix, which lets
+Python's re engine jump straight to candidate positions with a fast
+substring search; the three match streams are merged by position, so the
+text is never split into lines and lines without a marker cost nothing in
+Python. (A single alternation of the three markers defeats that prefix
+search and ends up slower than splitting lines.) When a line holds several
+markers, the leftmost one wins.
+
+Results are typed records (CityReport, DangerArea); parse_city_data returns
+the JSON-friendly dict form used by the training code and its caches.
+"""
+
+import heapq
+import logging
+import re
+
+logger = logging.getLogger('MapIA-Parser')
+
+# Bump when parsing changes: cached parse results are keyed on it
+PARSER_VERSION = 'report-1'
+
+_MARKERS = {
+    'city': re.compile(r'CITY:(.*)'),
+    'coords': re.compile(r'COORDINATES:(.*)'),
+    'zone': re.compile(r'DANGER ZONE:(.*)'),
+}
+
+def _iter_markers(text):
+    """(kind, match) for every marker, in text order, one per line at most."""
+    def stream(kind, regex):
+        for match in regex.finditer(text):
+            yield match.start(), kind, match
+
+    streams = [stream(kind, regex) for kind, regex in _MARKERS.items()]
+    line_end = -1
+    for start, kind, match in heapq.merge(*streams, key=lambda item: item[0]):
+        if start < line_end:
+            continue  # another marker already claimed this line
+        line_end = match.end()
+        yield kind, match
+
+class DangerArea:
+    __slots__ = ('name', 'lat', 'lon', 'radius', 'level', 'description')
+
+    def __init__(self, name, lat, lon, radius, level, description):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.radius = radius  # meters
+        self.level = level
+        self.description = description
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+class CityReport:
+    __slots__ = ('city_name', 'lat', 'lon', 'areas')
+
+    def __init__(self, city_name='', lat=0.0, lon=0.0, areas=None):
+        self.city_name = city_name
+        self.lat = lat
+        self.lon = lon
+        self.areas = areas if areas is not None else []
+
+    def as_dict(self):
+        return {
+            'city_name': self.city_name,
+            'coordinates': {'lat': self.lat, 'lon': self.lon},
+            'dangerous_areas': [area.as_dict() for area in self.areas],
+        }
+
+def _parse_zone(value):
+    parts = value.split(';')
+    if len(parts) < 6:
+        return None
+    return DangerArea(parts[0].strip(), float(parts[1]), float(parts[2]), float(parts[3]),
+                      parts[4].strip(), parts[5].strip())
+
+def parse_report(text, default_city=''):
+    """Parse a report into a CityReport; malformed lines are logged and skipped."""
+    report = CityReport(city_name=default_city)
+    for kind, match in _iter_markers(text):
+        value = match.group(1)
+        try:
+            if kind == 'zone':
+                area = _parse_zone(value)
+                if area is not None:
+                    report.areas.append(area)
+            elif kind == 'city':
+                report.city_name = value.strip()
+            else:
+                lat, lon = value.split(',')[:2]
+                report.lat, report.lon = float(lat), float(lon)
+        except ValueError as e:
+            logger.warning(f"Could not parse line: {match.group(0).strip()}, error: {e}")
+    return report
+
+def parse_city_data(text, default_city=''):
+    """
+    Parse extracted text into the city_data dict used for training:
+    {'city_name', 'coordinates': {'lat', 'lon'}, 'dangerous_areas': [...]}.
+    """
+    return parse_report(text, default_city).as_dict()
@@ -3,16 +3,21 @@
 
 import logging
 import math
+import os
 import base64
+import binascii
 import io
 from datetime import datetime
+from itertools import chain
 
 import numpy as np
 from PIL import Image
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+
+from batching import MicroBatcher
+from lazy_models import LazyModels, debug_mode, init_app, serving_process
+from model_registry import ModelRegistry
 
 # ——— Configuration Logging —————————————————————————————
 logging.basicConfig(
@@ -25,70 +30,328 @@ logger = logging.getLogger(__name__)
 URBAN_DENSITY_MODEL = None
 ACCESSIBILITY_MODEL = None
 OBJECT_MODEL = None  # modèle pour /identify
+MODELS = ModelRegistry()
 
-def initialize_models():
-    global URBAN_DENSITY_MODEL, ACCESSIBILITY_MODEL, OBJECT_MODEL
+# Entraînements de secours, utilisés seulement si l'artefact manque.
+# Graines fixes : tous les workers obtiennent le même modèle.
+# scikit-learn n'est importé que pour entraîner.
+def _train_urban_model():
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
 
-    # Modèles urbains
-    X = np.random.rand(200, 5)
-    y = np.random.randint(0, 10, 200)
+    rng = np.random.RandomState(42)
+    X = rng.rand(200, 5)
+    y = rng.randint(0, 10, 200)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    URBAN_DENSITY_MODEL = RandomForestClassifier(n_estimators=20, random_state=42)
-    URBAN_DENSITY_MODEL.fit(X_train, y_train)
-    ACCESSIBILITY_MODEL = RandomForestClassifier(n_estimators=20, random_state=42)
-    ACCESSIBILITY_MODEL.fit(X_train, y_train)
+    model = RandomForestClassifier(n_estimators=20, random_state=42)
+    model.fit(X_train, y_train)
+    return model
+
+def _train_object_model():
+    from sklearn.ensemble import RandomForestClassifier
 
     # Modèle dummy pour identify (on simule ici un RandomForest)
-    X_obj = np.random.rand(100, 10)  # 10 features extraites d'image
-    y_obj = np.random.randint(0, 5, 100)  # 5 classes d'objets
-    OBJECT_MODEL = RandomForestClassifier(n_estimators=15, random_state=42)
-    OBJECT_MODEL.fit(X_obj, y_obj)
+    rng = np.random.RandomState(42)
+    X_obj = rng.rand(100, 10)  # 10 features extraites d'image
+    y_obj = rng.randint(0, 5, 100)  # 5 classes d'objets
+    model = RandomForestClassifier(n_estimators=15, random_state=42)
+    model.fit(X_obj, y_obj)
+    return model
+
+MODELS.register("urban_density", _train_urban_model)
+MODELS.register("accessibility", _train_urban_model)
+MODELS.register("object", _train_object_model)
+
+def initialize_models():
+    global URBAN_DENSITY_MODEL, ACCESSIBILITY_MODEL, OBJECT_MODEL
+
+    MODELS.load_all()
+    URBAN_DENSITY_MODEL = MODELS.get("urban_density")
+    ACCESSIBILITY_MODEL = MODELS.get("accessibility")
+    OBJECT_MODEL = MODELS.get("object")
+
+    logger.info("✅ Modèles d'IA initialisés: %s", MODELS.versions())
+    return MODELS
 
-    logger.info("✅ Modèles d'IA initialisés")
+# Chargés en arrière-plan au démarrage (voir lazy_models.py) ; les
+# fonctions qui utilisent les modèles appellent d'abord models_ready()
+LAZY_MODELS = LazyModels()
+LAZY_MODELS.register("registry", initialize_models)
+DEBUG = debug_mode()
+
+def models_ready():
+    """Attend (ou lance) le chargement des modèles globaux."""
+    return LAZY_MODELS.get("registry")
 
 # ——— App & CORS —————————————————————————————————————————
 def create_app():
     app = Flask(__name__)
     CORS(app, resources={r"/*": {"origins": "*"}})
-    initialize_models()
+    init_app(app, LAZY_MODELS, warm_up=serving_process(__name__ == "__main__", DEBUG))
     return app
 
 app = create_app()
 
 # ——— Fonctions utilitaires ——————————————————————————————
-def calculate_area(coords):
-    if len(coords) < 3:
+EARTH_RADIUS_M = 6371008.8  # rayon moyen WGS84
+
+def pack_polygons(polygons):
+    """
+    Empile des polygones irréguliers dans un seul buffer plat.
+    Retourne (flat, offsets) : flat est un (P, 2) float64 et le polygone i
+    occupe flat[offsets[i]:offsets[i+1]].
+    """
+    lengths = np.fromiter((len(p) for p in polygons), dtype=np.int64, count=len(polygons))
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.array(list(chain.from_iterable(polygons)), dtype=np.float64).reshape(-1, 2)
+    if len(flat) != offsets[-1]:
+        raise ValueError("chaque sommet doit être une paire [lat, lon]")
+    return flat, offsets
+
+def polygon_areas(flat, offsets, geodesic=False):
+    """
+    Aire de chaque polygone packé, en une seule passe vectorisée (O(P)).
+    - planar : shoelace sur les coordonnées brutes (unités²)
+    - geodesic : coordonnées [lat, lon] en degrés, aire sphérique en m²
+    Les polygones de moins de 3 points ont une aire exactement nulle.
+    """
+    n_polys = len(offsets) - 1
+    lengths = np.diff(offsets)
+    if n_polys == 0 or len(flat) == 0:
+        return np.zeros(n_polys, dtype=np.float64)
+
+    # Indice du sommet suivant, avec retour au premier sommet de chaque anneau
+    nxt = np.arange(1, len(flat) + 1, dtype=np.int64)
+    nonempty = lengths > 0
+    nxt[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+    owner = np.repeat(np.arange(n_polys, dtype=np.int64), lengths)
+
+    if geodesic:
+        lat = np.radians(flat[:, 0])
+        lon = np.radians(flat[:, 1])
+        sin_lat = np.sin(lat)
+        terms = (lon[nxt] - lon) * (2.0 + sin_lat + sin_lat[nxt])
+        scale = EARTH_RADIUS_M ** 2 / 2.0
+    else:
+        x, y = flat[:, 0], flat[:, 1]
+        terms = x * y[nxt] - x[nxt] * y
+        scale = 0.5
+
+    areas = np.abs(np.bincount(owner, weights=terms, minlength=n_polys)) * scale
+    areas[lengths < 3] = 0.0
+    return areas
+
+def calculate_area(coords, geodesic=False):
+    flat, offsets = pack_polygons([coords])
+    return float(polygon_areas(flat, offsets, geodesic=geodesic)[0])
+
+def polyline_lengths(flat, offsets):
+    """
+    Longueur (m) de chaque polyligne packée [lat, lon], haversine vectorisé.
+    Seuls les segments internes à une polyligne sont comptés.
+    """
+    n_lines = len(offsets) - 1
+    if len(flat) < 2:
+        return np.zeros(n_lines, dtype=np.float64)
+    lat = np.radians(flat[:, 0])
+    lon = np.radians(flat[:, 1])
+    a = (np.sin((lat[1:] - lat[:-1]) / 2.0) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin((lon[1:] - lon[:-1]) / 2.0) ** 2)
+    seg = 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    owner = np.repeat(np.arange(n_lines, dtype=np.int64), np.diff(offsets))
+    same_line = owner[1:] == owner[:-1]
+    return np.bincount(owner[:-1][same_line], weights=seg[same_line], minlength=n_lines)
+
+def landuse_mix(landuse):
+    """Entropie de Shannon (bits) des types d'occupation du sol."""
+    if not landuse:
         return 0.0
-    area = 0.0
-    for i in range(len(coords)):
-        j = (i + 1) % len(coords)
-        area += coords[i][0] * coords[j][1] - coords[j][0] * coords[i][1]
-    return abs(area) / 2.0
-
-def decode_image(base64_str):
-    """Retourne un objet PIL.Image à partir d'un DataURL base64."""
-    header, b64 = base64_str.split(",", 1)
-    img_bytes = base64.b64decode(b64)
-    return Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    kinds = [lu.get("type") or lu.get("landuse") or "inconnu" for lu in landuse]
+    _, counts = np.unique(kinds, return_counts=True)
+    p = counts / counts.sum()
+    return float(-(p * np.log2(p)).sum())
+
+# Colonnes de la matrice de features des modèles urbains
+FEATURE_NAMES = ("building_count", "total_building_area_m2", "road_length_m",
+                 "water_count", "landuse_mix")
+
+def build_feature_matrix(locations, geodesic=True, packed_buildings=None):
+    """
+    Construit la matrice (N, 5) des features pour N emplacements
+    { buildings, roads, water, landUse } en une passe : tous les bâtiments
+    et toutes les routes de toutes les zones sont packés ensemble.
+    packed_buildings : (flat, offsets) des bâtiments déjà packés par
+    l'appelant, pour ne pas les packer deux fois.
+    """
+    n = len(locations)
+    X = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float64)
+    if n == 0:
+        return X
+    rows = np.arange(n, dtype=np.int64)
+
+    buildings = [loc.get("buildings", []) for loc in locations]
+    b_counts = np.fromiter(map(len, buildings), dtype=np.int64, count=n)
+    if packed_buildings is None:
+        packed_buildings = pack_polygons([b.get("coords", []) for bs in buildings for b in bs])
+    flat, offsets = packed_buildings
+    areas = polygon_areas(flat, offsets, geodesic=geodesic)
+    X[:, 0] = b_counts
+    X[:, 1] = np.bincount(np.repeat(rows, b_counts), weights=areas, minlength=n)
+
+    roads = [loc.get("roads", []) for loc in locations]
+    r_counts = np.fromiter(map(len, roads), dtype=np.int64, count=n)
+    flat, offsets = pack_polygons([r.get("coords", []) for rs in roads for r in rs])
+    lengths = polyline_lengths(flat, offsets)
+    X[:, 2] = np.bincount(np.repeat(rows, r_counts), weights=lengths, minlength=n)
+
+    X[:, 3] = [len(loc.get("water", [])) for loc in locations]
+    X[:, 4] = [landuse_mix(loc.get("landUse", [])) for loc in locations]
+    return X
+
+def polygon_centroids(flat, offsets):
+    """Centroïde (moyenne des sommets) de chaque polygone packé ; NaN si vide."""
+    n_polys = len(offsets) - 1
+    lengths = np.diff(offsets)
+    owner = np.repeat(np.arange(n_polys, dtype=np.int64), lengths)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lat = np.bincount(owner, weights=flat[:, 0], minlength=n_polys) / lengths
+        lon = np.bincount(owner, weights=flat[:, 1], minlength=n_polys) / lengths
+    return np.column_stack((lat, lon))
+
+# Heatmap de densité : résolution par défaut et plafond
+HEATMAP_RESOLUTION = 64
+HEATMAP_MAX_RESOLUTION = 512
+
+def parse_bbox(bbox):
+    """
+    [min_lat, min_lon, max_lat, max_lon] fournie par l'appelant, en floats.
+    ValueError si elle n'a pas 4 valeurs finies ou si elle est vide ou inversée.
+    """
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        raise ValueError("bbox doit être [min_lat, min_lon, max_lat, max_lon]")
+    min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox)
+    if not all(math.isfinite(v) for v in (min_lat, min_lon, max_lat, max_lon)):
+        raise ValueError("bbox non finie")
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise ValueError("bbox vide ou inversée")
+    return min_lat, min_lon, max_lat, max_lon
+
+def density_heatmap(centroids, resolution=HEATMAP_RESOLUTION, bbox=None):
+    """
+    Histogramme 2D vectorisé des centroïdes [lat, lon] sur une grille
+    resolution x resolution, quantifié en uint8 et encodé en base64.
+    bbox = [min_lat, min_lon, max_lat, max_lon] (par défaut l'emprise des points).
+    La ligne 0 correspond au nord (max_lat), comme une image.
+    """
+    resolution = int(min(max(int(resolution), 1), HEATMAP_MAX_RESOLUTION))
+    pts = centroids[np.isfinite(centroids).all(axis=1)]
+    if bbox is None:
+        if len(pts) == 0:
+            return None
+        min_lat, min_lon = pts.min(axis=0)
+        max_lat, max_lon = pts.max(axis=0)
+        if not (max_lat > min_lat and max_lon > min_lon):
+            # emprise dégénérée (un seul point) : on l'élargit d'un epsilon
+            min_lat, max_lat = min_lat - 1e-6, max(max_lat, min_lat + 1e-6) + 1e-6
+            min_lon, max_lon = min_lon - 1e-6, max(max_lon, min_lon + 1e-6) + 1e-6
+    else:
+        min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+
+    counts, _, _ = np.histogram2d(
+        pts[:, 0], pts[:, 1], bins=resolution,
+        range=[[min_lat, max_lat], [min_lon, max_lon]]
+    )
+    counts = counts[::-1]  # nord en haut
+    peak = float(counts.max()) if counts.size else 0.0
+    if peak > 0:
+        grid = np.rint(counts * (255.0 / peak)).astype(np.uint8)
+    else:
+        grid = np.zeros_like(counts, dtype=np.uint8)
+
+    return {
+        "width": resolution,
+        "height": resolution,
+        "bbox": [float(min_lat), float(min_lon), float(max_lat), float(max_lon)],
+        "max_count": int(peak),
+        "encoding": "uint8-base64",
+        "data": base64.b64encode(np.ascontiguousarray(grid).tobytes()).decode("ascii"),
+    }
+
+def score_features(X):
+    """Un seul predict vectorisé par forêt sur toute la matrice."""
+    models_ready()
+    return URBAN_DENSITY_MODEL.predict(X), ACCESSIBILITY_MODEL.predict(X)
+
+FEATURE_SIZE = (64, 64)  # taille de travail pour les features d'image
+LUMA = np.array([0.299, 0.587, 0.114])  # poids ITU-R BT.601
+
+def decode_image(base64_str, size=FEATURE_SIZE):
+    """
+    Retourne un objet PIL.Image à partir d'un DataURL base64 (ou de base64 brut).
+    Le base64 est décodé depuis une vue mémoire (pas de copie de la sous-chaîne)
+    et, pour les JPEG, `draft` décode directement à l'échelle 1/2, 1/4 ou 1/8
+    la plus proche de `size` au lieu de la pleine résolution.
+    """
+    raw = base64_str.encode("ascii")
+    start = raw.find(b",", 0, 256) + 1  # en-tête "data:image/...;base64,"
+    img_bytes = binascii.a2b_base64(memoryview(raw)[start:])
+    del raw
+    img = Image.open(io.BytesIO(img_bytes))
+    if size is not None:
+        img.draft("RGB", size)
+    return img if img.mode == "RGB" else img.convert("RGB")
 
 def extract_image_features(img: Image.Image):
     """
     Simule l'extraction de features d'une image PIL.
-    Ici on redimensionne et on prend les moyennes de canaux.
-    """
-    img = img.resize((64, 64))
-    arr = np.array(img) / 255.0
-    # 10 features : moyennes et écart-types sur R, G, B
-    feats = []
-    for c in range(3):
-        feats.append(arr[..., c].mean())
-        feats.append(arr[..., c].std())
-    feats.append(arr[..., :2].mean())  # 9
-    feats.append(arr[..., 1:].mean())  # 10
-    return np.array(feats).reshape(1, -1)
+    Redimensionne puis calcule les 10 features en une réduction vectorisée :
+    moyennes et écart-types R, G, B, moyennes RG et GB, moyenne et
+    écart-type de la luminance.
+    """
+    img = img.resize(FEATURE_SIZE, reducing_gap=3.0)
+    px = np.asarray(img, dtype=np.float64).reshape(-1, 3) / 255.0
+    mean = px.mean(axis=0)
+    std = px.std(axis=0)
+    luma = px @ LUMA
+    feats = np.array([
+        mean[0], std[0], mean[1], std[1], mean[2], std[2],
+        (mean[0] + mean[1]) / 2.0,  # == arr[..., :2].mean()
+        (mean[1] + mean[2]) / 2.0,  # == arr[..., 1:].mean()
+        luma.mean(), luma.std(),
+    ])
+    return feats.reshape(1, -1)
+
+# ——— Micro-batching /identify ————————————————————————————
+# Les requêtes concurrentes sont regroupées : un seul predict_proba par lot.
+IDENTIFY_BATCH_MAX = int(os.environ.get("IDENTIFY_BATCH_MAX", 32))
+IDENTIFY_BATCH_WAIT_MS = float(os.environ.get("IDENTIFY_BATCH_WAIT_MS", 3))
+
+def classify_features_batch(feature_rows):
+    """Un seul passage de forêt pour N vecteurs ; class_id dérivé de l'argmax."""
+    models_ready()
+    X = np.vstack(feature_rows)
+    proba = OBJECT_MODEL.predict_proba(X)
+    best = proba.argmax(axis=1)
+    classes = OBJECT_MODEL.classes_[best]
+    confidences = proba[np.arange(len(best)), best]
+    return [(int(c), float(p)) for c, p in zip(classes, confidences)]
+
+OBJECT_BATCHER = MicroBatcher(
+    classify_features_batch,
+    max_batch_size=IDENTIFY_BATCH_MAX,
+    max_wait_ms=IDENTIFY_BATCH_WAIT_MS,
+    name="identify-batcher",
+)
 
 # ——— Endpoints ——————————————————————————————————————————
 
+@app.route("/models", methods=["GET"])
+def models_versions():
+    """Versions (hash de contenu) des modèles chargés."""
+    models_ready()
+    return jsonify(MODELS.versions()), 200
+
 @app.route("/analyze", methods=["POST"])
 def analyze():
     """
@@ -102,8 +365,13 @@ def analyze():
         roads     = data.get("roads", [])
         water     = data.get("water", [])
         landuse   = data.get("landUse", [])
+        # Options de la heatmap : { resolution, bbox }
+        opts      = data.get("heatmap") or {}
         # -- validation simple
         assert isinstance(loc, list) and len(loc) == 2
+        assert isinstance(opts, dict)
+        if opts.get("bbox") is not None:
+            parse_bbox(opts["bbox"])
     except Exception as e:
         logger.error("❌ Analyse payload invalide: %s", e)
         return jsonify({"error": "Payload invalide"}), 400
@@ -115,20 +383,38 @@ def analyze():
         "water_count":    len(water),
         "landuse_count":  len(landuse),
     }
-    # Aire totale
-    stats["total_building_area_m2"] = round(
-        sum(calculate_area(b.get("coords", [])) for b in buildings), 2
-    )
-    # Scores IA simulés
-    stats["urban_density_score"]   = float(URBAN_DENSITY_MODEL.predict([[stats["building_count"],0,0,0,0]])[0])
-    stats["accessibility_score"]   = float(ACCESSIBILITY_MODEL.predict([[stats["road_count"],0,0,0,0]])[0])
+    # Features réelles (aire en m² géodésiques ; "planar" conserve l'ancien calcul en degrés²)
+    geodesic = data.get("area_mode", "geodesic") != "planar"
+    try:
+        # Packés une seule fois, pour les aires et pour la heatmap
+        flat, offsets = pack_polygons([b.get("coords", []) for b in buildings])
+        X = build_feature_matrix([data], geodesic=geodesic, packed_buildings=(flat, offsets))
+    except (AttributeError, TypeError, ValueError) as e:
+        logger.error("❌ Géométries invalides: %s", e)
+        return jsonify({"error": "Payload invalide"}), 400
+    stats["total_building_area_m2"] = round(float(X[0, 1]), 2)
+    stats["road_length_m"] = round(float(X[0, 2]), 2)
+    stats["landuse_mix"] = round(float(X[0, 4]), 3)
+
+    # Scores IA
+    density, accessibility = score_features(X)
+    stats["urban_density_score"]   = float(density[0])
+    stats["accessibility_score"]   = float(accessibility[0])
 
     # Patterns & recommandations
     patterns = identify_urban_patterns(buildings, roads, water, landuse)
     recommendations = generate_recommendations(buildings, roads, water, landuse, patterns)
 
-    # Heatmap simulée (vide ici pour alléger)
-    heatmap = []
+    # Heatmap de densité des bâtiments
+    try:
+        heatmap = density_heatmap(
+            polygon_centroids(flat, offsets),
+            resolution=opts.get("resolution", HEATMAP_RESOLUTION),
+            bbox=opts.get("bbox"),
+        )
+    except (TypeError, ValueError) as e:
+        logger.error("❌ Options heatmap invalides: %s", e)
+        return jsonify({"error": "Payload invalide"}), 400
 
     return jsonify({
         "timestamp": datetime.utcnow().isoformat() + "Z",
@@ -139,6 +425,56 @@ def analyze():
         "density_heatmap": heatmap
     }), 200
 
+@app.route("/analyze_batch", methods=["POST"])
+def analyze_batch():
+    """
+    Reçoit JSON { locations: [{ location, buildings, roads, water, landUse }, ...] }
+    Une seule matrice (N, 5) et un seul predict par modèle pour tout le lot.
+    """
+    data = request.get_json(force=True)
+    try:
+        locations = data["locations"]
+        assert isinstance(locations, list)
+        for item in locations:
+            assert isinstance(item["location"], list) and len(item["location"]) == 2
+        geodesic = data.get("area_mode", "geodesic") != "planar"
+        X = build_feature_matrix(locations, geodesic=geodesic)
+    except Exception as e:
+        logger.error("❌ Analyse batch payload invalide: %s", e)
+        return jsonify({"error": "Payload invalide"}), 400
+
+    density, accessibility = score_features(X) if len(X) else ([], [])
+
+    results = []
+    for i, item in enumerate(locations):
+        buildings = item.get("buildings", [])
+        roads     = item.get("roads", [])
+        water     = item.get("water", [])
+        landuse   = item.get("landUse", [])
+        patterns = identify_urban_patterns(buildings, roads, water, landuse)
+        results.append({
+            "location": item["location"],
+            "stats": {
+                "building_count":         len(buildings),
+                "road_count":             len(roads),
+                "water_count":            len(water),
+                "landuse_count":          len(landuse),
+                "total_building_area_m2": round(float(X[i, 1]), 2),
+                "road_length_m":          round(float(X[i, 2]), 2),
+                "landuse_mix":            round(float(X[i, 4]), 3),
+                "urban_density_score":    float(density[i]),
+                "accessibility_score":    float(accessibility[i]),
+            },
+            "patterns": patterns,
+            "recommendations": generate_recommendations(buildings, roads, water, landuse, patterns),
+        })
+
+    return jsonify({
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "count": len(results),
+        "results": results
+    }), 200
+
 @app.route("/identify", methods=["POST"])
 def identify():
     """
@@ -153,8 +489,7 @@ def identify():
     try:
         img = decode_image(img_b64)
         feats = extract_image_features(img)
-        class_id = int(OBJECT_MODEL.predict(feats)[0])
-        proba = float(np.max(OBJECT_MODEL.predict_proba(feats)))
+        class_id, proba = OBJECT_BATCHER.submit(feats[0])
         # Map d'exemple
         names = {0:"Bouteille",1:"Chaise",2:"Table",3:"Voiture",4:"Personne"}
         return jsonify({
@@ -190,6 +525,6 @@ def generate_recommendations(buildings, roads, water, landuse, patterns):
 
 if __name__ == "__main__":
     logger.info("🚀 Démarrage du serveur IA Flask sur :5000")
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, debug=DEBUG)
 
 
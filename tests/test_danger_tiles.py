@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+from danger_tiles import EMPTY_TILE, TileCache, tile_for
+from danger_zones import CityEnsemble
+
+class AlwaysDanger:
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        return np.tile([0.0, 1.0], (len(X), 1))
+
+LIBREVILLE = (0.40, 9.44, 0.42, 9.46)
+
+def ensemble():
+    return CityEnsemble().with_submodel('libreville', AlwaysDanger(), LIBREVILLE)
+
+def stored_tiles(cache):
+    return [name for _, _, files in os.walk(cache.directory) for name in files]
+
+def test_blank_tiles_are_not_stored(tmp_path):
+    cache = TileCache(str(tmp_path), samples=8)
+    assert cache.get(None, 'none', 5, 3, 7) is EMPTY_TILE
+    assert cache.get(ensemble(), 'v1', 14, 0, 0) is EMPTY_TILE
+    assert stored_tiles(cache) == []
+
+def test_city_tiles_are_stored(tmp_path):
+    cache = TileCache(str(tmp_path), samples=8)
+    x, y = tile_for(0.41, 9.45, 14)
+    data = cache.get(ensemble(), 'v1', 14, x, y)
+    assert data is not EMPTY_TILE
+    assert stored_tiles(cache) == [f'{y}.png']
+    assert cache.get(ensemble(), 'v1', 14, x, y) == data
+
+def test_stored_tiles_are_capped(tmp_path):
+    cache = TileCache(str(tmp_path), samples=4, max_tiles=10)
+    model = ensemble()
+    x0, y0 = tile_for(LIBREVILLE[2], LIBREVILLE[1], 17)
+    x1, y1 = tile_for(LIBREVILLE[0], LIBREVILLE[3], 17)
+    tiles = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)][:40]
+    assert len(tiles) == 40
+    for x, y in tiles:
+        cache.get(model, 'v1', 17, x, y)
+        assert len(stored_tiles(cache)) <= 10
@@ -0,0 +1,133 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from danger_zones import METERS_PER_DEGREE, grid_around, label_points, raster_zones
+
+def legacy_grid_labels(base_lat, base_lon, dangerous_areas, grid_size=0.01, grid_points=20):
+    """The training loop label_points replaced, kept verbatim."""
+    features, labels = [], []
+    for i in range(-grid_points, grid_points + 1):
+        for j in range(-grid_points, grid_points + 1):
+            point_lat = base_lat + i * grid_size / grid_points
+            point_lon = base_lon + j * grid_size / grid_points
+            in_danger_zone = False
+            for area in dangerous_areas:
+                dlat = point_lat - area['lat']
+                dlon = point_lon - area['lon']
+                distance_squared = dlat**2 + dlon**2
+                radius_degrees = area['radius'] / 111000
+                if distance_squared <= radius_degrees**2:
+                    in_danger_zone = True
+                    break
+            features.append([point_lat, point_lon])
+            labels.append(1 if in_danger_zone else 0)
+    return np.array(features), np.array(labels, dtype=np.uint8)
+
+def random_areas(rng, lat, lon, count):
+    return [{'lat': lat + rng.uniform(-0.012, 0.012), 'lon': lon + rng.uniform(-0.012, 0.012),
+             'radius': rng.uniform(20, 600)} for _ in range(count)]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_label_points_matches_legacy_loop(seed):
+    rng = np.random.default_rng(seed)
+    lat, lon = 0.39, 9.45
+    areas = random_areas(rng, lat, lon, 12)
+    expected_points, expected_labels = legacy_grid_labels(lat, lon, areas)
+    points = grid_around(lat, lon, extent=0.01, steps=20)
+    np.testing.assert_allclose(points, expected_points, atol=1e-12)
+    np.testing.assert_array_equal(label_points(points, areas), expected_labels)
+    assert expected_labels.any()
+
+def test_label_points_without_points_or_areas():
+    points = grid_around(0.0, 0.0, steps=2)
+    assert not label_points(points, []).any()
+    assert len(label_points(np.empty((0, 2)), random_areas(np.random.default_rng(0), 0, 0, 3))) == 0
+
+class GridModel:
+    """predict_proba returning a fixed danger raster, in grid_around order."""
+    classes_ = np.array([0, 1])
+
+    def __init__(self, danger):
+        self.danger = danger
+
+    def predict_proba(self, X):
+        p = self.danger.ravel()
+        assert len(X) == len(p)
+        return np.column_stack((1.0 - p, p))
+
+def flood_fill_components(mask):
+    """8-connected components by breadth-first search, in raster order of their first cell."""
+    seen = np.zeros_like(mask, dtype=bool)
+    components = []
+    rows, cols = mask.shape
+    for r in range(rows):
+        for c in range(cols):
+            if not mask[r, c] or seen[r, c]:
+                continue
+            cells, queue = [], deque([(r, c)])
+            seen[r, c] = True
+            while queue:
+                cr, cc = queue.popleft()
+                cells.append((cr, cc))
+                for dr in (-1, 0, 1):
+                    for dc in (-1, 0, 1):
+                        nr, nc = cr + dr, cc + dc
+                        if (0 <= nr < rows and 0 <= nc < cols
+                                and mask[nr, nc] and not seen[nr, nc]):
+                            seen[nr, nc] = True
+                            queue.append((nr, nc))
+            components.append(cells)
+    return components
+
+def fixture_raster(steps=6):
+    side = 2 * steps + 1
+    danger = np.full((side, side), 0.1)
+    # Two blocks touching only at a corner: one 8-connected zone
+    danger[1:3, 1:3] = 0.9
+    danger[3:5, 3:5] = 0.7
+    # Separate zone, and a single cell
+    danger[8:11, 1:3] = [[0.6, 0.55], [0.95, 0.6], [0.6, 0.52]]
+    danger[11, 10] = 0.66
+    # 4-connected only through a diagonal step
+    danger[7, 8] = danger[8, 9] = danger[9, 8] = 0.8
+    return danger
+
+def test_raster_zones_match_flood_fill():
+    steps, extent, threshold = 6, 0.006, 0.5
+    lat, lon = 0.39, 9.45
+    danger = fixture_raster(steps)
+    zones = raster_zones(GridModel(danger), lat, lon, extent=extent, steps=steps,
+                         threshold=threshold)
+    components = flood_fill_components(danger > threshold)
+    # The corner-touching blocks form a single 8-cell zone
+    assert sorted(map(len, components)) == [1, 3, 6, 8]
+    assert len(zones) == len(components)
+
+    cell = extent / steps
+    for zone, cells in zip(zones, components):
+        values = np.array([danger[r, c] for r, c in cells])
+        weights = values / values.sum()
+        row = sum(w * r for w, (r, _) in zip(weights, cells))
+        col = sum(w * c for w, (_, c) in zip(weights, cells))
+        assert zone['probability'] == pytest.approx(values.mean())
+        assert zone['max_probability'] == pytest.approx(values.max())
+        assert zone['lat'] == pytest.approx(lat - extent + row * cell)
+        assert zone['lon'] == pytest.approx(lon - extent + col * cell)
+        radius = np.sqrt(len(cells) / np.pi) * cell * METERS_PER_DEGREE
+        assert zone['radius'] == pytest.approx(radius)
+        # Every cell centre of the zone lies inside its outline
+        polygon = np.array(zone['polygon'])
+        for r, c in cells:
+            assert inside_convex(polygon, (lat - extent + r * cell, lon - extent + c * cell))
+
+def test_raster_zones_without_danger():
+    danger = np.zeros((5, 5))
+    assert raster_zones(GridModel(danger), 0.0, 0.0, extent=0.002, steps=2) == []
+
+def inside_convex(polygon, point):
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    to_point = np.asarray(point) - polygon
+    cross = edges[:, 0] * to_point[:, 1] - edges[:, 1] * to_point[:, 0]
+    return (cross >= -1e-12).all() or (cross <= 1e-12).all()
@@ -0,0 +1,37 @@
+import importlib
+
+import pytest
+
+from danger_zones import PointStore
+from extraction_cache import file_digest
+
+@pytest.fixture
+def mapia(tmp_path, monkeypatch):
+    # mapIA creates its log, upload and cache directories in the working directory
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module('mapIA')
+    monkeypatch.setattr(module, 'point_store', PointStore(str(tmp_path / 'points')))
+    monkeypatch.setattr(module, 'DANGER_MODEL_PATH', str(tmp_path / 'danger_zone_model.joblib'))
+    monkeypatch.setattr(module, 'danger_zone_model', None)
+    return module
+
+def test_corrupt_pdf_is_not_recorded_and_is_retried(mapia, tmp_path, monkeypatch):
+    pdf = tmp_path / 'corrupt.pdf'
+    pdf.write_bytes(b'%PDF-1.4\nnot really a pdf\n')
+
+    assert mapia.train_model_on_files([str(pdf)], grid_steps=2, workers=0,
+                                      incremental=True) is False
+    assert not mapia.point_store.has(file_digest(str(pdf)))
+    assert mapia.point_store.cities() == []
+
+    # A later upload of the same bytes goes through extraction again
+    extracted = []
+    iter_city_data = mapia.iter_city_data
+
+    def spy(file_paths, *args, **kwargs):
+        extracted.extend(file_paths)
+        return iter_city_data(file_paths, *args, **kwargs)
+
+    monkeypatch.setattr(mapia, 'iter_city_data', spy)
+    mapia.train_model_on_files([str(pdf)], grid_steps=2, workers=0, incremental=True)
+    assert extracted == [str(pdf)]
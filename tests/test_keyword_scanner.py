@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+from keyword_scanner import KeywordRegistry, KeywordScanner
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'vision_keywords.json')
+
+@pytest.fixture
+def scanner():
+    return KeywordRegistry(CONFIG).get('all')
+
+@pytest.mark.parametrize('line', [
+    "Le volume de la zone Nord a doublé.",
+    "Les volontaires du quartier Akébé sont remerciés.",
+    "The firewall of the district Centre was upgraded.",
+    "Risky investments in the area Port-Gentil.",
+])
+def test_keywords_do_not_match_inside_longer_words(scanner, line):
+    assert scanner.scan(line) == []
+
+@pytest.mark.parametrize('line, keyword', [
+    ("Plusieurs vols signalés : Akébé quartier", 'vols'),
+    ("Vol à l'arraché fréquent : Nkembo quartier", 'vol'),
+    ("Fire reported near Owendo district", 'fire'),
+    ("Zone à risque : Lalala quartier", 'à risque'),
+])
+def test_listed_inflections_match(scanner, line, keyword):
+    zones = scanner.scan(line)
+    assert len(zones) == 1
+    assert keyword in zones[0]['keywords']
+
+def test_version_changes_with_keywords():
+    assert KeywordScanner(['vol'], ['zone']).version != KeywordScanner(['vols'], ['zone']).version
+
+def test_config_file_is_valid_json():
+    with open(CONFIG, encoding='utf-8') as fh:
+        config = json.load(fh)
+    assert {'fr', 'en'} <= set(config)
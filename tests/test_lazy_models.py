@@ -0,0 +1,38 @@
+import os
+import signal
+import threading
+
+import pytest
+
+from lazy_models import LazyModels
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork indisponible')
+def test_child_reloads_model_left_loading_by_parent():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_loader():
+        started.set()
+        release.wait()
+        return 'model'
+
+    models = LazyModels()
+    models.register('slow', slow_loader)
+    models.warm_up()
+    started.wait()
+
+    # Fork pendant le chargement : verrou tenu, thread absent dans l'enfant
+    release.clear()
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        signal.alarm(10)  # un verrou hérité verrouillé bloquerait l'enfant
+        try:
+            release.set()
+            models.warm_up()
+            ok = models.get('slow') == 'model' and models.ready()
+        finally:
+            os._exit(0 if ok else 1)
+    release.set()
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert models.get('slow') == 'model'
@@ -0,0 +1,25 @@
+import numpy as np
+
+from model_registry import ModelRegistry
+
+def test_unreadable_artifact_is_trained_once_into_the_cache(tmp_path):
+    artifact = tmp_path / 'models' / 'm.joblib'
+    artifact.parent.mkdir()
+    artifact.write_bytes(b'pas un joblib')
+    calls = []
+
+    def trainer():
+        calls.append(1)
+        return {'weights': np.arange(10.0)}
+
+    entries = []
+    for _ in range(2):  # deux démarrages
+        registry = ModelRegistry(str(tmp_path / 'models'), trained_dir=str(tmp_path / 'cache'))
+        registry.register('m', trainer)
+        entries.append(registry.load('m'))
+
+    assert len(calls) == 1
+    assert artifact.read_bytes() == b'pas un joblib'
+    assert {e.path for e in entries} == {str(tmp_path / 'cache' / 'm.joblib')}
+    assert entries[0].version == entries[1].version
+    assert isinstance(entries[1].model['weights'], np.memmap)
@@ -0,0 +1,148 @@
+import importlib
+
+import numpy as np
+import pytest
+
+@pytest.fixture(scope='module')
+def server():
+    # Pas de chauffage des modèles : les cas testés n'en ont pas besoin
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('MODEL_WARMUP', '0')
+        yield importlib.import_module('server')
+
+def analyze(server, heatmap):
+    payload = {
+        'location': [0.39, 9.45],
+        'buildings': [{'coords': [[0.0, 0.0], [0.0, 0.001], [0.001, 0.001], [0.001, 0.0]]}],
+        'heatmap': heatmap,
+    }
+    return server.app.test_client().post('/analyze', json=payload)
+
+@pytest.mark.parametrize('bbox', [
+    [1.0, 0.0, 0.0, 1.0],   # latitudes inversées
+    [0.0, 1.0, 1.0, 0.0],   # longitudes inversées
+    [0.0, 0.0, 0.0, 1.0],   # aire nulle
+    [0.0, 0.0, 1.0],        # 3 valeurs
+    [0.0, 0.0, 'nan', 1.0],
+])
+def test_analyze_rejects_invalid_heatmap_bbox(server, bbox):
+    response = analyze(server, {'bbox': bbox})
+    assert response.status_code == 400
+
+def test_single_point_heatmap_is_padded(server):
+    heatmap = server.density_heatmap(np.array([[0.5, 9.5]]), resolution=4)
+    min_lat, min_lon, max_lat, max_lon = heatmap['bbox']
+    assert min_lat < 0.5 < max_lat and min_lon < 9.5 < max_lon
+    assert heatmap['max_count'] == 1
+
+def test_explicit_bbox_is_not_padded(server):
+    heatmap = server.density_heatmap(np.array([[0.5, 0.5]]), resolution=4,
+                                     bbox=[0.0, 0.0, 1.0, 1.0])
+    assert heatmap['bbox'] == [0.0, 0.0, 1.0, 1.0]
+
+# ——— Moteur géométrique vectorisé ——————————————————————————
+
+def shoelace(coords):
+    """Ancienne boucle par polygone (calculate_area avant vectorisation)."""
+    n = len(coords)
+    area = 0.0
+    for i in range(n):
+        j = (i + 1) % n
+        area += coords[i][0] * coords[j][1] - coords[j][0] * coords[i][1]
+    return abs(area) / 2.0
+
+def spherical_area(coords, radius):
+    """Même formule sphérique, un polygone à la fois."""
+    if len(coords) < 3:
+        return 0.0
+    total = 0.0
+    for i in range(len(coords)):
+        lat1, lon1 = np.radians(coords[i])
+        lat2, lon2 = np.radians(coords[(i + 1) % len(coords)])
+        total += (lon2 - lon1) * (2.0 + np.sin(lat1) + np.sin(lat2))
+    return abs(total) * radius ** 2 / 2.0
+
+def haversine_length(coords, radius):
+    total = 0.0
+    for (lat1, lon1), (lat2, lon2) in zip(np.radians(coords[:-1]), np.radians(coords[1:])):
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        total += 2 * radius * np.arcsin(np.sqrt(a))
+    return total
+
+def ragged_polygons(seed=0, count=40):
+    rng = np.random.default_rng(seed)
+    polygons = [[], [[0.4, 9.4]], [[0.4, 9.4], [0.5, 9.5]]]  # dégénérés
+    for _ in range(count):
+        n = int(rng.integers(3, 12))
+        center = rng.uniform([-60, -170], [60, 170])
+        angles = np.sort(rng.uniform(0, 2 * np.pi, n))
+        radius = rng.uniform(0.001, 0.05, (n, 1))
+        ring = center + radius * np.column_stack((np.sin(angles), np.cos(angles)))
+        polygons.append(ring.tolist())
+    rng.shuffle(polygons)
+    return polygons
+
+def test_one_degree_cell_at_equator(server):
+    flat, offsets = server.pack_polygons([[[0, 0], [0, 1], [1, 1], [1, 0]]])
+    expected = server.EARTH_RADIUS_M ** 2 * np.radians(1.0) * np.sin(np.radians(1.0))
+    area = server.polygon_areas(flat, offsets, geodesic=True)[0]
+    assert area == pytest.approx(expected, rel=1e-12)
+    # ~12 364 km², quel que soit le sens de parcours
+    flat, offsets = server.pack_polygons([[[1, 0], [1, 1], [0, 1], [0, 0]]])
+    area = server.polygon_areas(flat, offsets, geodesic=True)[0]
+    assert area == pytest.approx(1.2364e10, rel=1e-3)
+
+@pytest.mark.parametrize('geodesic', [False, True])
+def test_polygon_areas_match_per_polygon_loop(server, geodesic):
+    polygons = ragged_polygons()
+    flat, offsets = server.pack_polygons(polygons)
+    areas = server.polygon_areas(flat, offsets, geodesic=geodesic)
+    if geodesic:
+        expected = [spherical_area(p, server.EARTH_RADIUS_M) for p in polygons]
+    else:
+        expected = [shoelace(p) for p in polygons]
+    np.testing.assert_allclose(areas, expected, rtol=1e-9, atol=1e-9)
+
+def test_degenerate_rings_have_zero_area(server):
+    polygons = [[], [[1, 2]], [[1, 2], [3, 4]], [[0, 0], [0, 1], [1, 1]]]
+    flat, offsets = server.pack_polygons(polygons)
+    for geodesic in (False, True):
+        areas = server.polygon_areas(flat, offsets, geodesic=geodesic)
+        assert list(areas[:3]) == [0.0, 0.0, 0.0]
+        assert areas[3] > 0
+
+def test_polyline_lengths_match_per_line_loop(server):
+    lines = [[], [[0.4, 9.4]]] + ragged_polygons(seed=1, count=20) + [[[0, 0], [0, 1]]]
+    flat, offsets = server.pack_polygons(lines)
+    lengths = server.polyline_lengths(flat, offsets)
+    expected = [haversine_length(line, server.EARTH_RADIUS_M) for line in lines]
+    np.testing.assert_allclose(lengths, expected, rtol=1e-9, atol=1e-9)
+    assert lengths[0] == lengths[1] == 0.0
+    # 1° de longitude sur l'équateur
+    assert lengths[-1] == pytest.approx(server.EARTH_RADIUS_M * np.radians(1.0))
+
+def test_feature_matrix_matches_per_location(server):
+    polygons = ragged_polygons(seed=2, count=9)
+    locations = [
+        {'buildings': [{'coords': p} for p in polygons[:5]],
+         'roads': [{'coords': p} for p in polygons[5:8]],
+         'water': [{}], 'landUse': [{'type': 'residential'}, {'type': 'park'}]},
+        {'buildings': [], 'roads': []},
+        {'buildings': [{'coords': p} for p in polygons[8:]],
+         'roads': [{'coords': polygons[0]}]},
+    ]
+    X = server.build_feature_matrix(locations)
+    for row, loc in zip(X, locations):
+        buildings = [b['coords'] for b in loc['buildings']]
+        roads = [r['coords'] for r in loc['roads']]
+        assert row[0] == len(buildings)
+        assert row[1] == pytest.approx(sum(spherical_area(b, server.EARTH_RADIUS_M)
+                                           for b in buildings), rel=1e-9)
+        assert row[2] == pytest.approx(sum(haversine_length(r, server.EARTH_RADIUS_M)
+                                           for r in roads), rel=1e-9)
+        assert row[3] == len(loc.get('water', []))
+    assert X[0, 4] == pytest.approx(1.0)  # deux types à parts égales : 1 bit
+    packed = server.pack_polygons([b['coords'] for b in locations[0]['buildings']])
+    X_packed = server.build_feature_matrix(locations[:1], packed_buildings=packed)
+    np.testing.assert_array_equal(X_packed, X[:1])
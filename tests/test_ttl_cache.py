@@ -0,0 +1,42 @@
+import sqlite3
+
+from ttl_cache import SQLiteCache
+
+def test_workers_on_different_versions_keep_their_entries(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    old = SQLiteCache(path, version='v1')
+    new = SQLiteCache(path, version='v1')
+    old.set('question', 'answer v1')
+
+    new.set_version('v2')
+    assert new.get('question') is None
+    new.set('question', 'answer v2')
+
+    # Each worker still sees its own version after the other wrote
+    old.set_version('v1')
+    assert old.get('question') == 'answer v1'
+    assert new.get('question') == 'answer v2'
+    assert len(old) == 2
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), ttl=-1, version='v1')
+    cache.set('question', 'answer')
+    assert cache.get('question') is None
+
+def test_entries_are_bounded_across_versions(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_entries=3, version='v1')
+    for version in ('v1', 'v2'):
+        cache.set_version(version)
+        for i in range(3):
+            cache.set(f'q{i}', i)
+    assert len(cache) == 3
+    assert cache.get('q2') == 2
+
+def test_pre_versioned_table_is_replaced(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, value TEXT NOT NULL,'
+                     ' version TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)')
+    cache = SQLiteCache(path, version='v1')
+    cache.set('question', 'answer')
+    assert cache.get('question') == 'answer'
@@ -0,0 +1,40 @@
+import io
+import os
+
+import pytest
+from flask import Flask, jsonify, request
+
+from uploads import init_uploads
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    init_uploads(app, spool_dir=str(tmp_path / 'spool'), max_file_bytes=3 * MB,
+                 spool_memory=64 * 1024)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        upload = request.files['file']
+        return jsonify({'sha256': upload.stream.sha256, 'size': upload.stream.size})
+
+    return app
+
+def spool_files(app):
+    return os.listdir(app.config['UPLOAD_SPOOL_DIR'])
+
+def test_oversized_upload_leaves_no_spool_file(app):
+    client = app.test_client()
+    response = client.post('/upload', data={'file': (io.BytesIO(b'x' * 5 * MB), 'big.pdf')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 413
+    assert spool_files(app) == []
+
+def test_spool_file_removed_after_request(app):
+    client = app.test_client()
+    response = client.post('/upload', data={'file': (io.BytesIO(b'y' * MB), 'ok.pdf')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json()['size'] == MB
+    assert spool_files(app) == []
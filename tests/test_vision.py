@@ -0,0 +1,68 @@
+import io
+import os
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+import vision
+from extraction_cache import ExtractionCache
+
+def blank_pdf():
+    """PDF d'une page sans texte."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] >>"]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objects) + 1, xref))
+    return out.getvalue()
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    spool = tmp_path / 'spool'
+    spool.mkdir()
+    monkeypatch.setitem(vision.app.config, 'UPLOAD_SPOOL_DIR', str(spool))
+    monkeypatch.setitem(vision.app.config, 'UPLOAD_SPOOL_MEMORY', 0)
+    monkeypatch.setattr(vision, 'extraction_cache', ExtractionCache(str(tmp_path / 'cache')))
+    return spool
+
+def post_pdf(data, **kwargs):
+    return vision.app.test_client().post('/upload-pdf?stream=1',
+                                         data={'file': (io.BytesIO(data), 'doc.pdf')},
+                                         content_type='multipart/form-data', **kwargs)
+
+def test_unread_stream_response_removes_the_upload(spool_dir):
+    environ = EnvironBuilder(path='/upload-pdf?stream=1', method='POST',
+                             data={'file': (io.BytesIO(blank_pdf()), 'doc.pdf')}).get_environ()
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    body = vision.app.wsgi_app(environ, start_response)
+    assert statuses == ['200 OK']
+    assert len(os.listdir(spool_dir)) == 1
+    # Client parti avant le premier morceau : le serveur ferme la réponse
+    # sans l'avoir parcourue
+    body.close()
+    assert os.listdir(spool_dir) == []
+
+def test_streamed_response_removes_the_upload(spool_dir):
+    response = post_pdf(blank_pdf(), buffered=True)
+    assert response.get_data(as_text=True).splitlines()[-1] == '{"done": true, "pages": 1}'
+    assert os.listdir(spool_dir) == []
+
+def test_unreadable_pdf_removes_the_upload(spool_dir):
+    # L'erreur survient pendant l'envoi du corps, après les en-têtes
+    with pytest.raises(Exception, match='Root'):
+        post_pdf(b'%PDF-1.4\nnot a pdf\n', buffered=True)
+    assert os.listdir(spool_dir) == []
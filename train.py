@@ -3,13 +3,15 @@ import sys
 import joblib
 import numpy as np
 import pandas as pd
-import pdfplumber
 import logging
 import argparse
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 
+from pdf_ingest import iter_city_data
+from report_parser import PARSER_VERSION, parse_city_data
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,68 +26,6 @@ def setup_directories():
         os.makedirs(directory, exist_ok=True)
     logger.info(f"Directories created: {dirs}")
 
-def extract_text_from_pdf(pdf_path):
-    """Extract all text from a PDF file."""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = ""
-            for page in pdf.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-            return text
-    except Exception as e:
-        logger.error(f"Error extracting text from {pdf_path}: {e}")
-        return ""
-
-def parse_city_data(text):
-    """Parse extracted text to identify city data and danger zones."""
-    data = {
-        'city_name': 'Unknown',
-        'coordinates': {'lat': 0, 'lon': 0},
-        'dangerous_areas': []
-    }
-    
-    # Simple parsing logic - in a real app, this would use more robust NLP
-    lines = text.split('\n')
-    current_section = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Detect section headers
-        if "CITY:" in line:
-            data['city_name'] = line.split("CITY:")[1].strip()
-            
-        elif "COORDINATES:" in line:
-            try:
-                coords = line.split("COORDINATES:")[1].strip().split(',')
-                data['coordinates']['lat'] = float(coords[0])
-                data['coordinates']['lon'] = float(coords[1])
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Could not parse coordinates: {line}, error: {e}")
-                
-        elif "DANGER ZONE:" in line:
-            try:
-                # Expected format: "DANGER ZONE: name;lat;lon;radius;level;description"
-                parts = line.split("DANGER ZONE:")[1].strip().split(';')
-                if len(parts) >= 6:
-                    area = {
-                        'name': parts[0].strip(),
-                        'lat': float(parts[1]),
-                        'lon': float(parts[2]),
-                        'radius': float(parts[3]),
-                        'level': parts[4].strip(),
-                        'description': parts                        [5].strip()
-                    }
-                    data['dangerous_areas'].append(area)
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Could not parse danger zone info: {line}, error: {e}")
-    
-    return data
-
 def simulate_danger_zone_training(city_name, lat, lon):
     """Simulates training a danger zone model for a city."""
     features = []
@@ -135,13 +75,17 @@ def simulate_danger_zone_training(city_name, lat, lon):
     
     return True
 
-def train(file_paths):
+def train(file_paths, workers=None):
     """Train models on the provided file paths."""
-    for file_path in file_paths:
-        text = extract_text_from_pdf(file_path)
-        city_data = parse_city_data(text)
-        
-        if city_data['city_name'] != 'Unknown':
+    def report(pages_done, pages_total, file_path):
+        logger.info(f"Extracted page {pages_done}/{pages_total} ({os.path.basename(file_path)})")
+
+    for file_path, city_data in iter_city_data(file_paths, parse_city_data,
+                                               max_workers=workers, progress=report,
+                                               parser_version=PARSER_VERSION):
+        if city_data is None:
+            continue  # extraction error, already logged
+        if city_data['city_name']:
             logger.info(f"Training danger zone model for {city_data['city_name']}")
             success = simulate_danger_zone_training(
                 city_data['city_name'],
@@ -163,12 +107,18 @@ if __name__ == '__main__':
         nargs='+',
         help='PDF files containing city data'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Extraction processes (default: CPU count, 0: extract serially)'
+    )
     
     args = parser.parse_args()
     
     setup_directories()
     
     logger.info("Starting training process...")
-    train(args.files)
+    train(args.files, workers=args.workers)
     logger.info("Training process completed.")
 
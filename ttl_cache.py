@@ -0,0 +1,150 @@
+"""
+Bounded response caches with LRU eviction, TTL expiry and versioning.
+
+Both backends expose the same get/set/clear interface:
+
+- TTLCache: in-process, thread-safe OrderedDict.
+- SQLiteCache: a local SQLite file shared by every worker on the host, so
+  one worker's warm entries serve the others.
+
+Every entry is stored with the cache's current `version` (for example the
+model it was computed with), and entries from another version are never
+returned. TTLCache drops the stale entries when set_version() switches
+versions. SQLiteCache keys its rows by (key, version) instead: workers that
+share the file while running different versions (a rolling restart) keep
+their own entries rather than purging each other's, and the stale rows age
+out through the TTL and the LRU bound.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_key(text):
+    """Case-, accent- and whitespace-insensitive cache key."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+class TTLCache:
+    def __init__(self, max_entries=1024, ttl=3600.0, version=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = version
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_version(self, version):
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._data.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at, version = item
+            if version != self.version or expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl, self.version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    """Same interface as TTLCache; values must be JSON-serialisable."""
+
+    def __init__(self, path, max_entries=10000, ttl=3600.0, version=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = '' if version is None else str(version)
+        self._local = threading.local()
+        with self._conn() as conn:
+            # Pre-versioned layout, keyed by key alone
+            conn.execute('DROP TABLE IF EXISTS cache')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                ' key TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL, last_access REAL NOT NULL,'
+                ' PRIMARY KEY (key, version))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_lru'
+                         ' ON cache_entries(last_access)')
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers in other processes
+        # proceed while a writer commits
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def set_version(self, version):
+        # Rows of other versions stay: another worker may still use them
+        self.version = '' if version is None else str(version)
+
+    def get(self, key, default=None):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT value, expires_at FROM cache_entries WHERE key = ? AND version = ?',
+            (key, self.version)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        with conn:
+            if expires_at < now:
+                conn.execute('DELETE FROM cache_entries WHERE key = ? AND version = ?',
+                             (key, self.version))
+                return default
+            conn.execute('UPDATE cache_entries SET last_access = ? WHERE key = ? AND version = ?',
+                         (now, key, self.version))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries'
+                ' (key, version, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, self.version, json.dumps(value), now + self.ttl, now)
+            )
+            conn.execute('DELETE FROM cache_entries WHERE expires_at < ?', (now,))
+            conn.execute(
+                'DELETE FROM cache_entries WHERE rowid IN (SELECT rowid FROM cache_entries'
+                ' ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM cache_entries')
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
@@ -0,0 +1,155 @@
+"""
+Streaming file uploads shared by the MapIA and vision services.
+
+Werkzeug normally parses multipart bodies into its own spooled temp files,
+which the views then copy again (file.save, file_digest, pdfplumber reading
+the stream). Here every uploaded part is written, chunk by chunk as the
+body is parsed, into a SpooledUpload that:
+
+- keeps small files in memory and spills larger ones to a temp file in the
+  spool directory (on the same filesystem as the final destination, so
+  persisting is a rename rather than a copy);
+- hashes the bytes on the fly (SHA-256), so dedup and content-addressed
+  caches need no second read;
+- rejects files above the per-file limit with 413 as soon as the limit is
+  crossed, while MAX_CONTENT_LENGTH bounds the whole request.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+DEFAULT_MAX_REQUEST_BYTES = int(os.environ.get('UPLOAD_MAX_REQUEST_BYTES', 512 * 1024 * 1024))
+DEFAULT_MAX_FILE_BYTES = int(os.environ.get('UPLOAD_MAX_FILE_BYTES', 200 * 1024 * 1024))
+DEFAULT_SPOOL_MEMORY = int(os.environ.get('UPLOAD_SPOOL_MEMORY', 1024 * 1024))
+
+class SpooledUpload:
+    """File object Werkzeug writes an uploaded part into; then read like a file."""
+
+    def __init__(self, directory=None, max_memory=DEFAULT_SPOOL_MEMORY, max_bytes=None):
+        self.directory = directory
+        self.max_memory = max_memory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = io.BytesIO()
+        self._path = None
+        self._owned = True
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            # Werkzeug drops the part without closing it: delete the spool
+            # file now, or every oversized upload would leave one behind
+            self.close()
+            raise RequestEntityTooLarge(f"Uploaded file exceeds {self.max_bytes} bytes")
+        self._hash.update(data)
+        if self._path is None and self.size > self.max_memory:
+            self._rollover()
+        return self._file.write(data)
+
+    def _rollover(self):
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.upload')
+        disk_file = os.fdopen(fd, 'w+b')
+        disk_file.write(self._file.getbuffer())
+        disk_file.seek(self._file.tell())
+        self._file = disk_file
+        self._path = path
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of the bytes written so far (the whole file once parsed)."""
+        return self._hash.hexdigest()
+
+    def path(self):
+        """Path of the upload on disk, spilling it from memory if needed."""
+        if self._path is None:
+            position = self._file.tell()
+            self._rollover()
+            self._file.seek(position)
+        self._file.flush()
+        return self._path
+
+    def detach(self):
+        """
+        Path of the upload on disk, which the caller now owns and must
+        delete; it survives the end of the request.
+        """
+        path = self.path()
+        self._owned = False
+        return path
+
+    def persist(self, destination):
+        """
+        Move the upload to `destination` (a rename when already spilled to
+        disk). Returns False, leaving the existing file untouched, when the
+        destination already exists.
+        """
+        if os.path.exists(destination):
+            return False
+        os.replace(self.path(), destination)
+        self._path = destination
+        self._owned = False
+        return True
+
+    def close(self):
+        self._file.close()
+        if self._path is not None and self._owned:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def __getattr__(self, name):
+        # read, seek, tell, readline... go to the current backing file
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class UploadRequest(Request):
+    """
+    Request class streaming file parts into SpooledUpload objects. Every
+    part is closed with the request, including parts Werkzeug never added
+    to request.files because parsing was aborted (client gone, size limit).
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        config = current_app.config
+        upload = SpooledUpload(directory=config.get('UPLOAD_SPOOL_DIR'),
+                               max_memory=config.get('UPLOAD_SPOOL_MEMORY', DEFAULT_SPOOL_MEMORY),
+                               max_bytes=config.get('UPLOAD_MAX_FILE_BYTES'))
+        self.__dict__.setdefault('_spooled_uploads', []).append(upload)
+        return upload
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for upload in self.__dict__.pop('_spooled_uploads', []):
+                upload.close()
+
+def init_uploads(app, spool_dir=None, max_request_bytes=DEFAULT_MAX_REQUEST_BYTES,
+                 max_file_bytes=DEFAULT_MAX_FILE_BYTES, spool_memory=DEFAULT_SPOOL_MEMORY):
+    """Install streaming uploads and size limits on a Flask app."""
+    if spool_dir is not None:
+        os.makedirs(spool_dir, exist_ok=True)
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = max_request_bytes
+    app.config['UPLOAD_MAX_FILE_BYTES'] = max_file_bytes
+    app.config['UPLOAD_SPOOL_MEMORY'] = spool_memory
+    app.config['UPLOAD_SPOOL_DIR'] = spool_dir
@@ -1,51 +1,137 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import contextlib
+import json
+import os
 import pdfplumber
-import re  # Importer la bibliothèque de expressions régulières pour l'extraction
+
+from extraction_cache import ExtractionCache
+from keyword_scanner import KeywordRegistry
+from uploads import init_uploads
 
 app = Flask(__name__)
 CORS(app)
+# Réception des fichiers en flux, hachés au vol, avec limites de taille
+init_uploads(app, spool_dir=os.environ.get('UPLOAD_SPOOL_DIR'))
+
+# À incrémenter quand analyze_pdf_text change : les résultats en cache en dépendent
+ANALYZER_VERSION = 'vision-3'
+extraction_cache = ExtractionCache()
+
+# Mots-clés par langue (fr, en), rechargés à chaud quand le fichier change
+KEYWORDS_PATH = os.environ.get('VISION_KEYWORDS',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            'vision_keywords.json'))
+keyword_registry = KeywordRegistry(KEYWORDS_PATH)
 
 @app.route('/upload-pdf', methods=['POST'])
 def upload_pdf():
     """
     Traiter le fichier PDF téléversé pour l'analyse des zones à éviter.
+    Avec ?stream=1 (ou Accept: application/x-ndjson), les zones sont
+    renvoyées en NDJSON page par page, au fil de l'extraction.
     """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
     pdf_file = request.files['file']
-    text = extract_text_from_pdf(pdf_file)
-    zones_to_avoid = analyze_pdf_text(text)
+    scanner = keyword_registry.get(request.form.get('lang', 'all'))
+
+    # L'upload est déjà sur disque (ou en mémoire s'il est petit) et haché
+    # pendant la réception : pdfplumber lit directement le fichier
+    upload = pdf_file.stream
+    digest = upload.sha256
+
+    if wants_stream():
+        # Werkzeug ferme les fichiers du formulaire dès que la vue a rendu
+        # sa réponse : la réponse devient propriétaire du fichier et le
+        # supprime à sa fermeture, qu'elle ait été parcourue ou non
+        # (client parti avant le premier morceau)
+        pdf_path = upload.detach()
+
+        def generate():
+            pages = 0
+            for page_number, zones in iter_zones_by_page(pdf_path, digest, scanner):
+                pages = page_number
+                yield json.dumps({'page': page_number, 'zones_to_avoid': zones}) + '\n'
+            yield json.dumps({'done': True, 'pages': pages}) + '\n'
+
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.call_on_close(lambda: remove_file(pdf_path))
+        return response
+
+    zones_to_avoid = [zone for _, zones in iter_zones_by_page(upload.path(), digest, scanner)
+                      for zone in zones]
     return jsonify({'zones_to_avoid': zones_to_avoid}), 200
 
-def extract_text_from_pdf(pdf_file):
+@app.errorhandler(413)
+def upload_too_large(error):
+    return jsonify({'error': error.description}), 413
+
+def remove_file(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+def wants_stream():
+    if request.args.get('stream', request.form.get('stream', '')).lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def iter_zones_by_page(pdf_path, digest, scanner):
     """
-    Extraire du texte d'un fichier PDF en utilisant pdfplumber.
+    Générateur de (numéro de page, zones de la page).
+
+    Cache par contenu : un même PDF n'est extrait qu'une fois, et analysé
+    une fois par jeu de mots-clés. Le résultat complet n'est mis en cache
+    que si le document a été parcouru jusqu'au bout.
+    """
+    analyzer_version = f"{ANALYZER_VERSION}-{scanner.version}"
+    cached = extraction_cache.get_parsed(digest, analyzer_version)
+    if cached is not None:
+        by_page = {}
+        for zone in cached['zones']:
+            by_page.setdefault(zone['page'], []).append(zone)
+        for page_number in range(1, cached['pages'] + 1):
+            yield page_number, by_page.get(page_number, [])
+        return
+
+    all_zones = []
+    pages = extraction_cache.open_pages(digest)
+    with contextlib.ExitStack() as stack:
+        if pages is None:
+            write = stack.enter_context(extraction_cache.page_writer(digest))
+            pages = iter_pdf_pages(pdf_path, on_page=write)
+        page_count = 0
+        for page_count, text in enumerate(pages, start=1):
+            zones = analyze_pdf_text(text, scanner)
+            for zone in zones:
+                zone['page'] = page_count
+            all_zones.extend(zones)
+            yield page_count, zones
+    extraction_cache.put_parsed(digest, analyzer_version,
+                                {'pages': page_count, 'zones': all_zones})
+
+def iter_pdf_pages(pdf_file, on_page=None):
+    """
+    Générateur du texte de chaque page (chaîne vide pour les pages sans
+    texte), page par page : seule la page courante reste en mémoire.
     """
-    text = ""
     with pdfplumber.open(pdf_file) as pdf:
         for page in pdf.pages:
-            text += page.extract_text() + "\n"
-    return text
+            text = page.extract_text() or ""
+            page.close()  # libère les objets de mise en page de la page
+            if on_page is not None:
+                on_page(text)
+            yield text
 
-def analyze_pdf_text(text):
+def analyze_pdf_text(text, scanner=None):
     """
     Analyse du texte pour identifier des zones à éviter.
+    Le document entier est parcouru une seule fois par le scanner de mots-clés.
     """
-    keywords = ['danger', 'avoid', 'accident', 'crime', 'unsafe']
-    zones = []
-
-    for line in text.splitlines():
-        for keyword in keywords:
-            if keyword in line.lower():
-                # Utiliser une expression régulière pour extraire le nom de la zone
-                match = re.search(r'(\w+|\w+\s\w+) \s*(?:zone|quartier|ville)', line, re.I)
-                if match:
-                    zone_name = match.group(0).strip()
-                    zones.append({'name': zone_name, 'description': line})
-
-    return zones
+    if scanner is None:
+        scanner = keyword_registry.get()
+    return scanner.scan(text)
 
 if __name__ == '__main__':
     app.run(port=5006, debug=True)